@@ -0,0 +1,172 @@
+"""Benchmark backends of google_music_proto.musicmanager.utils.transcode_to_mp3.
+
+Compares transcoding short slices, like the 128 kbps samples sent by
+Sample.generate_sample, in a transcoder process and in process with LAME.
+Backends that aren't installed are reported as errors.
+
+Examples::
+
+	$ python benchmarks/bench_backends.py
+	$ python benchmarks/bench_backends.py --durations 15 30 --json > backends.json
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import tempfile
+import time
+
+import synthetic
+
+# 44.1 kHz, 16-bit, stereo PCM.
+BYTE_RATE = 44100 * 2 * 2
+
+
+def _get_backends():
+	from google_music_proto.musicmanager.utils import (
+		FFmpegBackend,
+		LAMEBackend,
+	)
+
+	return {
+		backend.name: backend
+		for backend in [FFmpegBackend(), LAMEBackend()]
+	}
+
+
+def run_case(backend, filepath, slice_start, slice_duration, quality, repeat):
+	from google_music_proto.musicmanager.utils import transcode_to_mp3
+
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		output = transcode_to_mp3(
+			filepath,
+			slice_start=slice_start,
+			slice_duration=slice_duration,
+			quality=quality,
+			backend=backend,
+		)
+		times.append(time.perf_counter() - start)
+
+	return min(times), len(output)
+
+
+def run(args):
+	backends = _get_backends()
+	results = []
+
+	with tempfile.TemporaryDirectory() as directory:
+		filepath = synthetic.generate(directory, 'wave', int(args.minutes * 60 * BYTE_RATE))
+
+		for duration, quality in itertools.product(args.durations, args.qualities):
+			baseline = None
+			for name in args.backends:
+				result = {
+					'backend': name,
+					'duration': duration,
+					'quality': quality,
+				}
+
+				try:
+					seconds, output_size = run_case(
+						backends[name],
+						filepath,
+						args.start,
+						duration,
+						quality,
+						args.repeat,
+					)
+				except Exception as e:
+					result['error'] = f'{type(e).__name__}: {e}'
+				else:
+					result.update({'seconds': seconds, 'output_size': output_size})
+
+					if baseline is None:
+						baseline = seconds
+					else:
+						result['speedup'] = baseline / seconds
+
+				results.append(result)
+
+				if not args.json:
+					print_result(result)
+
+	return results
+
+
+def print_result(result):
+	name = f"{result['backend']:<7} {result['duration']:>5.1f} s  quality={result['quality']:<5}"
+
+	if 'error' in result:
+		print(f"{name}  {result['error']}")
+		return
+
+	line = f"{name}  {result['seconds'] * 1000:>8.1f} ms  {result['output_size'] / 1024:>8.1f} KiB"
+	if 'speedup' in result:
+		line += f"  {result['speedup']:>6.2f}x"
+
+	print(line)
+
+
+def _quality(value):
+	return int(value) if value.isdigit() else value
+
+
+def parse_args(argv=None):
+	backends = list(_get_backends())
+
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument(
+		'--backends', nargs='+', choices=backends, default=backends,
+		help="Backends to benchmark. Speedups are relative to the first.",
+	)
+	parser.add_argument(
+		'--durations', nargs='+', type=float, default=[5, 30],
+		help="Slice durations in seconds.",
+	)
+	parser.add_argument(
+		'--qualities', nargs='+', type=_quality, default=['128k'],
+		help="Qualities as CBR bitrates (e.g. 128k) or VBR qualities (e.g. 5).",
+	)
+	parser.add_argument(
+		'--start', type=float, default=60,
+		help="Slice start in seconds.",
+	)
+	parser.add_argument(
+		'--minutes', type=float, default=4,
+		help="Audio duration in minutes.",
+	)
+	parser.add_argument(
+		'--repeat', type=int, default=5,
+		help="Runs per case. The best time is reported.",
+	)
+	parser.add_argument(
+		'--json', action='store_true',
+		help="Output results as JSON.",
+	)
+
+	return parser.parse_args(argv)
+
+
+def main(argv=None):
+	args = parse_args(argv)
+	results = run(args)
+
+	if args.json:
+		json.dump(
+			{
+				'python': platform.python_version(),
+				'platform': platform.platform(),
+				'results': results,
+			},
+			sys.stdout,
+			indent=2,
+		)
+		print()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,178 @@
+"""Benchmark seeking modes of google_music_proto.musicmanager.utils.transcode_to_mp3.
+
+Compares output seeking (``-ss`` after ``-i``) with input seeking (``-ss`` before ``-i``)
+when transcoding a sample from near the end of long synthetic audio files.
+MP3 files are also sliced natively at frame boundaries without a transcoder.
+Transcodes always use the ffmpeg/avconv backend, as other backends ignore ``seek``.
+Requires ffmpeg or avconv with MP3 support.
+
+Examples::
+
+	$ python benchmarks/bench_transcode.py
+	$ python benchmarks/bench_transcode.py --minutes 10 60 --json > seek.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import synthetic
+
+MiB = 1024 * 1024
+
+# Bytes per second of audio in the synthetic files.
+BYTE_RATES = {
+	# 44.1 kHz, 16-bit, stereo PCM.
+	'wave': 44100 * 2 * 2,
+	# 128 kbps CBR.
+	'mp3-id3v2': 128000 // 8,
+}
+
+SEEK_MODES = ['output', 'input', 'native']
+
+
+def run_case(filepath, seek, slice_start, slice_duration, repeat):
+	from google_music_proto.musicmanager.utils import (
+		FFmpegBackend,
+		transcode_to_mp3,
+	)
+
+	backend = FFmpegBackend()
+
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		output = transcode_to_mp3(
+			filepath,
+			slice_start=slice_start,
+			slice_duration=slice_duration,
+			quality='128k',
+			seek='output' if seek == 'native' else seek,
+			seek_fallback=False,
+			native_mp3=seek == 'native',
+			backend=backend,
+		)
+		times.append(time.perf_counter() - start)
+
+	return min(times), len(output)
+
+
+def run(args):
+	results = []
+
+	with tempfile.TemporaryDirectory() as directory:
+		for format_, minutes in itertools.product(args.formats, args.minutes):
+			duration = minutes * 60
+			filepath = synthetic.generate(directory, format_, int(duration * BYTE_RATES[format_]))
+			slice_start = int(duration * args.position)
+
+			baseline = None
+			for seek in SEEK_MODES:
+				if seek == 'native' and not format_.startswith('mp3'):
+					continue
+
+				result = {
+					'format': format_,
+					'minutes': minutes,
+					'seek': seek,
+					'slice_start': slice_start,
+				}
+
+				try:
+					seconds, output_size = run_case(filepath, seek, slice_start, args.duration, args.repeat)
+				except Exception as e:
+					result['error'] = f'{type(e).__name__}: {e}'
+				else:
+					result.update({'seconds': seconds, 'output_size': output_size})
+
+					if baseline is None:
+						baseline = seconds
+					else:
+						result['speedup'] = baseline / seconds
+
+				results.append(result)
+
+				if not args.json:
+					print_result(result)
+
+			os.remove(filepath)
+
+	return results
+
+
+def print_result(result):
+	name = f"{result['format']:<11} {result['minutes']:>6.1f} min  seek={result['seek']:<6}"
+
+	if 'error' in result:
+		print(f"{name}  {result['error']}")
+		return
+
+	line = f"{name}  {result['seconds']:>8.3f} s  {result['output_size'] / 1024:>8.1f} KiB"
+	if 'speedup' in result:
+		line += f"  {result['speedup']:>6.2f}x"
+
+	print(line)
+
+
+def parse_args(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument(
+		'--formats', nargs='+', choices=list(BYTE_RATES), default=list(BYTE_RATES),
+		help="Audio formats to generate.",
+	)
+	parser.add_argument(
+		'--minutes', nargs='+', type=float, default=[5, 30],
+		help="Audio durations in minutes.",
+	)
+	parser.add_argument(
+		'--position', type=float, default=0.9,
+		help="Sample start as a fraction of the audio duration.",
+	)
+	parser.add_argument(
+		'--duration', type=int, default=30,
+		help="Sample duration in seconds.",
+	)
+	parser.add_argument(
+		'--repeat', type=int, default=3,
+		help="Runs per case. The best time is reported.",
+	)
+	parser.add_argument(
+		'--json', action='store_true',
+		help="Output results as JSON.",
+	)
+
+	return parser.parse_args(argv)
+
+
+def main(argv=None):
+	args = parse_args(argv)
+
+	from google_music_proto.musicmanager.utils import get_transcoder
+
+	try:
+		get_transcoder()
+	except ValueError as e:
+		sys.exit(str(e))
+
+	results = run(args)
+
+	if args.json:
+		json.dump(
+			{
+				'python': platform.python_version(),
+				'platform': platform.platform(),
+				'results': results,
+			},
+			sys.stdout,
+			indent=2,
+		)
+		print()
+
+
+if __name__ == '__main__':
+	main()
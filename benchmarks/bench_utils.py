@@ -0,0 +1,261 @@
+"""Benchmark the hot paths of google_music_proto.musicmanager.utils.
+
+Each case is run in a fresh process so peak RSS is measured per case.
+MP4 files are only used with the ClientIDHasher benchmark, as audio-metadata can't parse them.
+
+Examples::
+
+	$ python benchmarks/bench_utils.py
+	$ python benchmarks/bench_utils.py --sizes 1 64 --json > before.json
+	$ python benchmarks/bench_utils.py --sizes 1 64 --compare before.json
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import synthetic
+
+try:
+	import resource
+except ImportError:  # pragma: nocover
+	resource = None
+
+MiB = 1024 * 1024
+
+# audio-metadata doesn't support MP4, so it's only used with benchmarks that don't parse metadata.
+METADATA_FREE_FORMATS = {'mp4'}
+METADATA_FREE_BENCHMARKS = {'ClientIDHasher'}
+
+
+def _peak_rss():
+	# On Linux, ru_maxrss carries over the parent's peak across exec.
+	try:
+		with open('/proc/self/status') as f:
+			for line in f:
+				if line.startswith('VmHWM:'):
+					return int(line.split()[1]) * 1024
+	except OSError:
+		pass
+
+	if resource is None:
+		return None
+
+	peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+	# Linux reports KiB, macOS reports bytes.
+	return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+def _hash_stream(filepath):
+	from google_music_proto.musicmanager.utils import ClientIDHasher
+
+	hasher = ClientIDHasher()
+	with open(filepath, 'rb') as f:
+		for chunk in iter(lambda: f.read(MiB), b''):
+			hasher.update(chunk)
+
+	return hasher.finalize()
+
+
+def _get_benchmarks():
+	from google_music_proto.musicmanager.calls import Metadata
+	from google_music_proto.musicmanager.utils import (
+		generate_client_id,
+		get_album_art,
+	)
+
+	return {
+		'generate_client_id': generate_client_id,
+		'generate_client_id[no-mmap]': lambda filepath: generate_client_id(filepath, use_mmap=False),
+		'ClientIDHasher': _hash_stream,
+		'get_album_art': get_album_art,
+		'get_track_info': Metadata.get_track_info,
+	}
+
+
+def _run_case(benchmark, filepath, repeat):
+	func = _get_benchmarks()[benchmark]
+
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		func(filepath)
+		times.append(time.perf_counter() - start)
+
+	return min(times), _peak_rss()
+
+
+def run_case(benchmark, filepath, repeat):
+	ctx = multiprocessing.get_context('spawn')
+	with ctx.Pool(1) as pool:
+		return pool.apply(_run_case, (benchmark, filepath, repeat))
+
+
+def run(args):
+	results = []
+
+	with tempfile.TemporaryDirectory() as directory:
+		for format_, size, num_pictures in itertools.product(args.formats, args.sizes, args.pictures):
+			filepath = synthetic.generate(
+				directory,
+				format_,
+				int(size * MiB),
+				num_pictures=num_pictures,
+				picture_size=int(args.picture_size * MiB),
+			)
+			filesize = os.path.getsize(filepath)
+
+			for benchmark in args.benchmarks:
+				if (
+					format_ in METADATA_FREE_FORMATS
+					and benchmark not in METADATA_FREE_BENCHMARKS
+				):
+					continue
+
+				result = {
+					'benchmark': benchmark,
+					'format': format_,
+					'size': filesize,
+					'pictures': num_pictures,
+				}
+
+				try:
+					seconds, peak_rss = run_case(benchmark, filepath, args.repeat)
+				except Exception as e:
+					result['error'] = f'{type(e).__name__}: {e}'
+				else:
+					result.update(
+						{
+							'seconds': seconds,
+							'mb_per_second': filesize / MiB / seconds,
+							'files_per_second': 1 / seconds,
+							'peak_rss': peak_rss,
+						}
+					)
+
+				results.append(result)
+
+				if not args.json:
+					print_result(result, args.baseline)
+
+			os.remove(filepath)
+
+	return results
+
+
+def _key(result):
+	return (result['benchmark'], result['format'], result['size'], result['pictures'])
+
+
+def print_result(result, baseline=None):
+	name = f"{result['benchmark']:<28} {result['format']:<11} {result['size'] / MiB:>8.1f} MiB {result['pictures']:>2} pics"
+
+	if 'error' in result:
+		print(f"{name}  {result['error']}")
+		return
+
+	line = (
+		f"{name}  {result['mb_per_second']:>9.1f} MB/s  {result['files_per_second']:>9.1f} files/s"
+	)
+
+	if result['peak_rss'] is not None:
+		line += f"  {result['peak_rss'] / MiB:>7.1f} MiB RSS"
+
+	if baseline:
+		previous = baseline.get(_key(result))
+		if previous and 'seconds' in previous:
+			line += f"  {previous['seconds'] / result['seconds']:>5.2f}x vs baseline"
+
+	print(line)
+
+
+def _git_revision():
+	try:
+		return subprocess.run(
+			['git', 'rev-parse', 'HEAD'],
+			stdout=subprocess.PIPE,
+			stderr=subprocess.DEVNULL,
+			universal_newlines=True,
+			check=True,
+		).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def parse_args(argv=None):
+	benchmarks = list(_get_benchmarks())
+
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument(
+		'--benchmarks', nargs='+', choices=benchmarks, default=benchmarks,
+		help="Functions to benchmark.",
+	)
+	parser.add_argument(
+		'--formats', nargs='+', choices=list(synthetic.FORMATS), default=list(synthetic.FORMATS),
+		help="Audio formats to generate.",
+	)
+	parser.add_argument(
+		'--sizes', nargs='+', type=float, default=[1, 16, 128],
+		help="Audio sizes in MiB.",
+	)
+	parser.add_argument(
+		'--pictures', nargs='+', type=int, default=[0, 3],
+		help="Numbers of embedded pictures.",
+	)
+	parser.add_argument(
+		'--picture-size', type=float, default=1,
+		help="Size of each embedded picture in MiB.",
+	)
+	parser.add_argument(
+		'--repeat', type=int, default=3,
+		help="Runs per case. The best time is reported.",
+	)
+	parser.add_argument(
+		'--json', action='store_true',
+		help="Output results as JSON.",
+	)
+	parser.add_argument(
+		'--compare', metavar='FILE',
+		help="JSON output of a previous run to compare against.",
+	)
+
+	return parser.parse_args(argv)
+
+
+def main(argv=None):
+	args = parse_args(argv)
+
+	args.baseline = None
+	if args.compare:
+		with open(args.compare) as f:
+			args.baseline = {
+				_key(result): result
+				for result in json.load(f)['results']
+			}
+
+	results = run(args)
+
+	if args.json:
+		json.dump(
+			{
+				'revision': _git_revision(),
+				'python': platform.python_version(),
+				'platform': platform.platform(),
+				'results': results,
+			},
+			sys.stdout,
+			indent=2,
+		)
+		print()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,299 @@
+"""Generate synthetic audio files for benchmarks.
+
+The audio data isn't decodable; it only has to be structurally valid
+enough for audio-metadata to parse and for client ID generation to hash.
+"""
+
+__all__ = [
+	'FORMATS',
+	'generate',
+	'generate_flac',
+	'generate_mp3',
+	'generate_mp4',
+	'generate_ogg_vorbis',
+	'generate_picture',
+	'generate_wave',
+]
+
+import os
+import struct
+from base64 import b64encode
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding, stereo.
+MP3_FRAME_HEADER = b'\xFF\xFB\x90\x00'
+MP3_FRAME_SIZE = 417
+
+
+def _synchsafe(value):
+	return bytes(
+		(value >> shift) & 0x7F
+		for shift in [21, 14, 7, 0]
+	)
+
+
+def generate_picture(size):
+	"""Generate PNG-like picture data of about ``size`` bytes."""
+
+	ihdr = struct.pack('>IIBBBBB', 500, 500, 8, 2, 0, 0, 0)
+
+	return (
+		b'\x89PNG\r\n\x1a\n'
+		+ struct.pack('>I', len(ihdr)) + b'IHDR' + ihdr + b'\x00' * 4
+		+ os.urandom(max(size - 33, 0))
+	)
+
+
+def _id3v2(pictures, *, title='test-title'):
+	frames = b''
+
+	text = b'\x03' + title.encode('utf-8')
+	frames += b'TIT2' + struct.pack('>I', len(text)) + b'\x00\x00' + text
+
+	for picture_type, picture in pictures:
+		apic = b'\x00image/png\x00' + bytes([picture_type]) + b'\x00' + picture
+		frames += b'APIC' + struct.pack('>I', len(apic)) + b'\x00\x00' + apic
+
+	return b'ID3\x03\x00\x00' + _synchsafe(len(frames)) + frames
+
+
+def _id3v1(*, title='test-title'):
+	return b'TAG' + title.encode('latin-1').ljust(30, b'\x00') + b'\x00' * 94 + b'\xFF'
+
+
+def generate_mp3(size, *, pictures=(), id3v1=False, id3v2=True):
+	"""Generate MP3 data with about ``size`` bytes of audio."""
+
+	frame = MP3_FRAME_HEADER + b'\x00' * (MP3_FRAME_SIZE - 4)
+	audio = frame * max(size // MP3_FRAME_SIZE, 10)
+
+	data = audio
+	if id3v2:
+		data = _id3v2(pictures) + data
+	if id3v1:
+		data += _id3v1()
+
+	return data
+
+
+def _flac_block(block_type, data, *, is_last=False):
+	return struct.pack('>I', (is_last << 31) | (block_type << 24) | len(data)) + data
+
+
+def _flac_picture(picture_type, picture):
+	mime_type = b'image/png'
+
+	return (
+		struct.pack('>II', picture_type, len(mime_type)) + mime_type
+		+ struct.pack('>I', 0)
+		+ struct.pack('>4I', 500, 500, 24, 0)
+		+ struct.pack('>I', len(picture)) + picture
+	)
+
+
+def _vorbis_comments(pictures, *, title='test-title'):
+	comments = [f'TITLE={title}'.encode('utf-8')]
+	for picture_type, picture in pictures:
+		comments.append(
+			b'METADATA_BLOCK_PICTURE=' + b64encode(_flac_picture(picture_type, picture))
+		)
+
+	vendor = b'benchmark'
+	data = struct.pack('<I', len(vendor)) + vendor + struct.pack('<I', len(comments))
+	for comment in comments:
+		data += struct.pack('<I', len(comment)) + comment
+
+	return data
+
+
+def generate_flac(size, *, pictures=()):
+	"""Generate FLAC data with about ``size`` bytes of audio."""
+
+	sample_rate = 44100
+	total_samples = sample_rate * 60
+
+	# min/max block size, min/max frame size, sample rate, channels - 1, bits per sample - 1, total samples.
+	streaminfo = struct.pack('>HH', 4096, 4096) + b'\x00' * 6
+	streaminfo += (
+		(sample_rate << 44) | (1 << 41) | (15 << 36) | total_samples
+	).to_bytes(8, 'big')
+	streaminfo += os.urandom(16)
+
+	blocks = [(0, streaminfo), (4, _vorbis_comments([]))]
+	for picture_type, picture in pictures:
+		blocks.append((6, _flac_picture(picture_type, picture)))
+
+	data = b'fLaC'
+	for i, (block_type, block_data) in enumerate(blocks):
+		data += _flac_block(block_type, block_data, is_last=i == len(blocks) - 1)
+
+	return data + os.urandom(size)
+
+
+def _ogg_page(lacing_values, body, *, position, sequence_number, flags=0):
+	# The CRC isn't checked by audio-metadata, so it's left as 0.
+	return (
+		struct.pack(
+			'<4sBBqIIIB',
+			b'OggS', 0, flags, position, 1, sequence_number, 0, len(lacing_values),
+		)
+		+ bytes(lacing_values)
+		+ body
+	)
+
+
+def _ogg_paginate(packets, *, sequence_number):
+	# Lay packets out in as few pages as possible.
+	pages = []
+	lacing_values = []
+	body = b''
+	is_continued = False
+
+	for packet in packets:
+		packet_lacing_values = [255] * (len(packet) // 255) + [len(packet) % 255]
+		offset = 0
+
+		while packet_lacing_values:
+			count = min(255 - len(lacing_values), len(packet_lacing_values))
+			size = sum(packet_lacing_values[:count])
+
+			lacing_values += packet_lacing_values[:count]
+			body += packet[offset:offset + size]
+			offset += size
+			del packet_lacing_values[:count]
+
+			if len(lacing_values) == 255:
+				pages.append(
+					_ogg_page(
+						lacing_values,
+						body,
+						position=0,
+						sequence_number=sequence_number,
+						flags=int(is_continued),
+					)
+				)
+				sequence_number += 1
+				is_continued = bool(packet_lacing_values)
+				lacing_values = []
+				body = b''
+
+	if lacing_values:
+		pages.append(
+			_ogg_page(
+				lacing_values,
+				body,
+				position=0,
+				sequence_number=sequence_number,
+				flags=int(is_continued),
+			)
+		)
+		sequence_number += 1
+
+	return pages, sequence_number
+
+
+def generate_ogg_vorbis(size, *, pictures=()):
+	"""Generate Ogg Vorbis data with about ``size`` bytes of audio."""
+
+	identification = (
+		b'\x01vorbis'
+		+ struct.pack('<I', 0)
+		+ struct.pack('<B4i', 2, 44100, 0, 128000, 0)
+		+ b'\xB8\x01'
+	)
+	comment = b'\x03vorbis' + _vorbis_comments(pictures) + b'\x01'
+	setup = b'\x05vorbis' + b'\x00' * 256
+
+	data = _ogg_page([len(identification)], identification, position=0, sequence_number=0, flags=2)
+
+	pages, sequence_number = _ogg_paginate([comment, setup], sequence_number=1)
+	data += b''.join(pages)
+
+	packet_size = 4096
+	num_packets = max(size // packet_size, 2)
+	for i in range(num_packets):
+		data += _ogg_page(
+			[255] * (packet_size // 255) + [packet_size % 255],
+			os.urandom(packet_size),
+			position=(i + 1) * 1024,
+			sequence_number=sequence_number + i,
+			flags=4 if i == num_packets - 1 else 0,
+		)
+
+	return data
+
+
+def _mp4_atom(atom_type, data):
+	return struct.pack('>I', len(data) + 8) + atom_type + data
+
+
+def generate_mp4(size, *, pictures=()):
+	"""Generate MP4 data with about ``size`` bytes of audio."""
+
+	ftyp = _mp4_atom(b'ftyp', b'M4A \x00\x00\x00\x00M4A mp42isom')
+
+	ilst = b''
+	for _, picture in pictures[:1]:
+		ilst += _mp4_atom(b'covr', _mp4_atom(b'data', struct.pack('>II', 14, 0) + picture))
+
+	moov = _mp4_atom(
+		b'moov',
+		_mp4_atom(b'mvhd', b'\x00' * 100)
+		+ _mp4_atom(b'udta', _mp4_atom(b'meta', b'\x00' * 4 + _mp4_atom(b'ilst', ilst))),
+	)
+
+	return ftyp + moov + _mp4_atom(b'mdat', os.urandom(size))
+
+
+def generate_wave(size, *, pictures=()):
+	"""Generate WAVE data with about ``size`` bytes of audio."""
+
+	fmt = struct.pack('<HHIIHH', 1, 2, 44100, 44100 * 4, 4, 16)
+	size -= size % 4
+
+	chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+	chunks += b'data' + struct.pack('<I', size) + os.urandom(size)
+
+	if pictures:
+		id3 = _id3v2(pictures)
+		chunks += b'id3 ' + struct.pack('<I', len(id3)) + id3
+
+	return b'RIFF' + struct.pack('<I', len(chunks) + 4) + b'WAVE' + chunks
+
+
+FORMATS = {
+	'flac': (generate_flac, '.flac'),
+	'mp3-id3v1': (lambda size, *, pictures=(): generate_mp3(size, pictures=pictures, id3v1=True, id3v2=bool(pictures)), '.mp3'),
+	'mp3-id3v2': (generate_mp3, '.mp3'),
+	'mp4': (generate_mp4, '.m4a'),
+	'ogg-vorbis': (generate_ogg_vorbis, '.ogg'),
+	'wave': (generate_wave, '.wav'),
+}
+
+
+def generate(directory, format_, size, *, num_pictures=0, picture_size=512 * 1024):
+	"""Write a synthetic audio file and return its path.
+
+	Parameters:
+		directory (os.PathLike or str): The directory to write the file to.
+		format_ (str): One of the keys of :data:`FORMATS`.
+		size (int): The approximate size of the audio data in bytes.
+		num_pictures (int): The number of embedded pictures.
+		picture_size (int): The approximate size of each picture in bytes.
+	"""
+
+	generator, extension = FORMATS[format_]
+
+	# Front cover last so album art selection has to look past the others.
+	pictures = [
+		(0 if i < num_pictures - 1 else 3, generate_picture(picture_size))
+		for i in range(num_pictures)
+	]
+
+	filepath = os.path.join(
+		os.fspath(directory),
+		f'{format_}-{size}-{num_pictures}{extension}',
+	)
+	with open(filepath, 'wb') as f:
+		f.write(generator(size, pictures=pictures))
+
+	return filepath
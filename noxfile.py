@@ -47,6 +47,24 @@ def test(session):
 	session.notify('report')
 
 
+@nox.session
+def bench(session):
+	session.install('-U', '.')
+	session.run('python', 'benchmarks/bench_utils.py', *session.posargs)
+
+
+@nox.session(name='bench-transcode')
+def bench_transcode(session):
+	session.install('-U', '.')
+	session.run('python', 'benchmarks/bench_transcode.py', *session.posargs)
+
+
+@nox.session(name='bench-backends')
+def bench_backends(session):
+	session.install('-U', '.[lame]')
+	session.run('python', 'benchmarks/bench_backends.py', *session.posargs)
+
+
 @nox.session
 def report(session):
 	session.install('-U', 'coverage[toml]')
@@ -0,0 +1,300 @@
+__all__ = [
+	'AsyncExecutor',
+	'transcode_to_mp3',
+	'transcode_to_mp3_stream',
+]
+
+import asyncio
+import functools
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from attr import attrib, attrs
+
+from .calls import Metadata
+from .utils import (
+	_STDERR_TAIL_SIZE,
+	_build_transcode_command,
+	_transcode_error_message,
+	generate_client_id,
+)
+
+
+@attrs(slots=True)
+class AsyncExecutor:
+	"""Run blocking audio file work from asyncio without blocking the event loop.
+
+	File parsing and hashing are offloaded to an executor.
+	At most ``max_workers`` calls are submitted to the executor at once;
+	the rest wait in the event loop where they can be cancelled cleanly.
+
+	Note:
+		A call that is cancelled after it has started in the executor
+		finishes in the background, but its result is discarded.
+
+	Parameters:
+		max_workers (int, Optional):
+			The maximum number of calls to run at once.
+			Default: The number of CPUs on the machine.
+		executor (concurrent.futures.Executor, Optional):
+			The executor to run calls in.
+			Arguments must be picklable if using a process pool.
+			Default: A thread pool of ``max_workers`` threads owned by this object.
+	"""
+
+	max_workers = attrib(default=None)
+	executor = attrib(default=None)
+
+	_owns_executor = attrib(default=False, init=False, repr=False)
+	_semaphore = attrib(default=None, init=False, repr=False)
+
+	def __attrs_post_init__(self):
+		if self.max_workers is None:
+			self.max_workers = os.cpu_count() or 1
+
+		if self.executor is None:
+			self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+			self._owns_executor = True
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, *exc_info):
+		self.close()
+
+	def close(self):
+		"""Shut down the executor if owned by this object."""
+
+		if self._owns_executor:
+			self.executor.shutdown(wait=False)
+
+	async def run(self, func, *args, **kwargs):
+		"""Run a blocking callable in the executor.
+
+		Parameters:
+			func (callable): The callable to run.
+			*args: Positional arguments for ``func``.
+			**kwargs: Keyword arguments for ``func``.
+
+		Returns:
+			The return value of ``func``.
+		"""
+
+		# Created lazily so it's bound to the running event loop.
+		if self._semaphore is None:
+			self._semaphore = asyncio.Semaphore(self.max_workers)
+
+		async with self._semaphore:
+			return await asyncio.get_event_loop().run_in_executor(
+				self.executor,
+				functools.partial(func, *args, **kwargs),
+			)
+
+	async def generate_client_id(self, song, **kwargs):
+		"""Asynchronous :func:`generate_client_id`."""
+
+		return await self.run(generate_client_id, song, **kwargs)
+
+	async def get_track_info(self, song, **kwargs):
+		"""Asynchronous :meth:`Metadata.get_track_info`."""
+
+		return await self.run(Metadata.get_track_info, song, **kwargs)
+
+
+async def _write_stdin(stdin, input_):
+	try:
+		stdin.write(input_)
+		await stdin.drain()
+	except (BrokenPipeError, ConnectionResetError):
+		# The transcoder exited or was killed.
+		pass
+	finally:
+		stdin.close()
+
+
+async def _read_stderr(stderr):
+	tail = bytearray()
+	while True:
+		chunk = await stderr.read(4096)
+		if not chunk:
+			break
+
+		tail += chunk
+		del tail[:-_STDERR_TAIL_SIZE]
+
+	return bytes(tail)
+
+
+async def _iter_transcode(command, input_=None, *, chunk_size=64 * 1024, timeout=None):
+	loop = asyncio.get_event_loop()
+	deadline = None if timeout is None else loop.time() + timeout
+
+	try:
+		process = await asyncio.create_subprocess_exec(
+			*command,
+			stdin=subprocess.DEVNULL if input_ is None else subprocess.PIPE,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.PIPE,
+		)
+	except OSError as e:
+		e.message = _transcode_error_message(command, e, None)
+		raise
+
+	tasks = [asyncio.ensure_future(_read_stderr(process.stderr))]
+	if input_ is not None:
+		tasks.append(asyncio.ensure_future(_write_stdin(process.stdin, input_)))
+
+	def remaining():
+		if deadline is None:
+			return None
+
+		return max(deadline - loop.time(), 0)
+
+	try:
+		while True:
+			try:
+				chunk = await asyncio.wait_for(process.stdout.read(chunk_size), remaining())
+			except asyncio.TimeoutError:
+				raise subprocess.TimeoutExpired(command, timeout) from None
+
+			if not chunk:
+				break
+
+			yield chunk
+
+		try:
+			returncode = await asyncio.wait_for(process.wait(), remaining())
+		except asyncio.TimeoutError:
+			raise subprocess.TimeoutExpired(command, timeout) from None
+
+		stderr = await tasks[0]
+
+		if returncode != 0:
+			e = subprocess.CalledProcessError(returncode, command, stderr=stderr)
+			e.message = _transcode_error_message(command, e, stderr)
+
+			raise e
+	finally:
+		# Kill the transcoder on timeout, cancellation, or early close.
+		if process.returncode is None:
+			try:
+				process.kill()
+			except ProcessLookupError:
+				pass
+
+			await process.wait()
+
+		for task in tasks:
+			task.cancel()
+
+		await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _build_command(song, **kwargs):
+	# Finding and probing the transcoder runs processes the first time,
+	# and a PreparedSong may still need its metadata loaded,
+	# so the command is built in the default executor.
+	return await asyncio.get_event_loop().run_in_executor(
+		None,
+		functools.partial(_build_transcode_command, song, **kwargs),
+	)
+
+
+async def transcode_to_mp3(
+	song, *, slice_start=None, slice_duration=None, quality='320k', seek='output', seek_fallback=True, timeout=None
+):
+	"""Asynchronous :func:`transcode_to_mp3` using an asyncio subprocess.
+
+	Cancelling the call kills the transcoder.
+
+	Note:
+		On Windows before Python 3.8, the event loop must be a :class:`asyncio.ProactorEventLoop`.
+
+	Parameters:
+		timeout (float, Optional):
+			The maximum number of seconds each transcode attempt may take.
+			The transcoder is killed and :exc:`subprocess.TimeoutExpired` is raised if exceeded.
+			Default: No limit.
+
+	Returns:
+		bytes: The transcoded MP3 data.
+	"""
+
+	command, input_ = await _build_command(
+		song,
+		slice_start=slice_start,
+		slice_duration=slice_duration,
+		quality=quality,
+		seek=seek,
+	)
+
+	fallback = (
+		seek == 'input'
+		and slice_start is not None
+		and seek_fallback
+	)
+
+	try:
+		chunks = []
+		async for chunk in _iter_transcode(command, input_, timeout=timeout):
+			chunks.append(chunk)
+	except subprocess.CalledProcessError:
+		if not fallback:
+			raise
+
+		chunks = []
+
+	if not chunks and fallback:
+		return await transcode_to_mp3(
+			song,
+			slice_start=slice_start,
+			slice_duration=slice_duration,
+			quality=quality,
+			timeout=timeout,
+		)
+
+	return b''.join(chunks)
+
+
+async def transcode_to_mp3_stream(
+	song,
+	*,
+	slice_start=None,
+	slice_duration=None,
+	quality='320k',
+	seek='output',
+	chunk_size=64 * 1024,
+	timeout=None,
+):
+	"""Asynchronous :func:`transcode_to_mp3_stream` using an asyncio subprocess.
+
+	An asynchronous generator of chunks of MP3 data.
+	Closing the generator early or cancelling the task iterating it kills the transcoder.
+
+	Note:
+		On Windows before Python 3.8, the event loop must be a :class:`asyncio.ProactorEventLoop`.
+
+	Parameters:
+		chunk_size (int, Optional):
+			The maximum size of chunks.
+			Default: ``65536``
+		timeout (float, Optional):
+			The maximum number of seconds the transcode may take.
+			The transcoder is killed and :exc:`subprocess.TimeoutExpired` is raised if exceeded.
+			Default: No limit.
+
+	Yields:
+		bytes: Chunks of MP3 data.
+	"""
+
+	command, input_ = await _build_command(
+		song,
+		slice_start=slice_start,
+		slice_duration=slice_duration,
+		quality=quality,
+		seek=seek,
+	)
+
+	async for chunk in _iter_transcode(command, input_, chunk_size=chunk_size, timeout=timeout):
+		yield chunk
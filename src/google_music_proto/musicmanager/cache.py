@@ -0,0 +1,509 @@
+__all__ = [
+	'AlbumArtCache',
+	'ClientIDCache',
+	'SampleCache',
+]
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from base64 import b64encode
+from collections import OrderedDict
+from hashlib import md5
+
+from attr import attrib, attrs
+
+
+@attrs(slots=True)
+class AlbumArtCache:
+	"""An in-memory cache of album art keyed by a digest of its content.
+
+	Tracks of an album usually share the same cover image.
+	The cache holds one copy of each distinct image
+	and its base64 encoding, computed once when first needed.
+
+	Parameters:
+		max_size (int, Optional):
+			The maximum number of bytes of image data and base64 text to hold.
+			The least recently used images are evicted first.
+			Default: 64 MiB
+	"""
+
+	max_size = attrib(default=64 * 1024 * 1024)
+
+	_entries = attrib(factory=OrderedDict, init=False, repr=False)
+	_lock = attrib(factory=threading.Lock, init=False, repr=False)
+	_size = attrib(default=0, init=False, repr=False)
+
+	def __contains__(self, digest):
+		return digest in self._entries
+
+	def __len__(self):
+		return len(self._entries)
+
+	@property
+	def size(self):
+		"""The number of bytes of image data and base64 text held."""
+
+		return self._size
+
+	@staticmethod
+	def digest(album_art):
+		"""Get the content digest of album art.
+
+		Parameters:
+			album_art (bytes): The binary data of an album art image.
+
+		Returns:
+			str: The hex MD5 digest of the image data,
+			as sent in ``ALBUM_ART_HASH`` by :meth:`Metadata.get_track_info`.
+		"""
+
+		return md5(album_art).hexdigest()
+
+	def _store(self, digest, entry):
+		self._entries[digest] = entry
+		self._entries.move_to_end(digest)
+
+		while self._size > self.max_size and self._entries:
+			_, (data, b64) = self._entries.popitem(last=False)
+			self._size -= len(data) + len(b64 or '')
+
+	def put(self, album_art, *, digest=None):
+		"""Store album art.
+
+		Parameters:
+			album_art (bytes): The binary data of an album art image.
+			digest (str, Optional):
+				The content digest of ``album_art`` from :meth:`digest`, if already computed.
+
+		Returns:
+			bytes: The cached copy of the image data if an identical image is held,
+			else ``album_art``.
+		"""
+
+		if digest is None:
+			digest = self.digest(album_art)
+
+		with self._lock:
+			entry = self._entries.get(digest)
+			if entry is not None:
+				self._entries.move_to_end(digest)
+				return entry[0]
+
+			self._size += len(album_art)
+			self._store(digest, (album_art, None))
+
+		return album_art
+
+	def get(self, digest):
+		"""Get album art by content digest.
+
+		Parameters:
+			digest (str): The content digest from :meth:`digest`.
+
+		Returns:
+			bytes: The image data, or ``None`` if not held.
+		"""
+
+		with self._lock:
+			entry = self._entries.get(digest)
+			if entry is None:
+				return None
+
+			self._entries.move_to_end(digest)
+
+		return entry[0]
+
+	def b64encode(self, album_art, *, digest=None):
+		"""Get the base64 encoding of album art, encoding it only if not already held.
+
+		Parameters:
+			album_art (bytes): The binary data of an album art image.
+			digest (str, Optional):
+				The content digest of ``album_art`` from :meth:`digest`, if already computed.
+
+		Returns:
+			str: The image data as base64-encoded text.
+		"""
+
+		if digest is None:
+			digest = self.digest(album_art)
+
+		with self._lock:
+			entry = self._entries.get(digest)
+			if entry is not None and entry[1] is not None:
+				self._entries.move_to_end(digest)
+				return entry[1]
+
+		b64 = b64encode(album_art).decode()
+
+		with self._lock:
+			entry = self._entries.get(digest)
+			if entry is None:
+				self._size += len(album_art) + len(b64)
+				self._store(digest, (album_art, b64))
+			elif entry[1] is None:
+				self._size += len(b64)
+				self._store(digest, (entry[0], b64))
+
+		return b64
+
+	def clear(self):
+		"""Remove all cached album art."""
+
+		with self._lock:
+			self._entries.clear()
+			self._size = 0
+
+
+def _file_identity(filepath):
+	filepath = os.path.abspath(os.fspath(filepath))
+	stat = os.stat(filepath)
+
+	return (
+		filepath,
+		stat.st_dev,
+		stat.st_ino,
+		stat.st_size,
+		stat.st_mtime_ns,
+	)
+
+
+@attrs(slots=True)
+class ClientIDCache:
+	"""A persistent cache of client IDs stored in an SQLite database.
+
+	Entries are keyed by file path, device, inode, size, and modification time.
+	A file that has changed in any of those ways is a cache miss.
+
+	Parameters:
+		filepath (os.PathLike or str):
+			The path to the cache database.
+			Use ``':memory:'`` for a cache that isn't persisted.
+		max_entries (int, Optional):
+			The maximum number of entries to keep.
+			The least recently used entries are evicted first.
+			Default: No limit.
+	"""
+
+	filepath = attrib(converter=os.fspath)
+	max_entries = attrib(default=None)
+
+	_connection = attrib(default=None, init=False, repr=False)
+	_count = attrib(default=0, init=False, repr=False)
+	_lock = attrib(factory=threading.Lock, init=False, repr=False)
+
+	def __attrs_post_init__(self):
+		self._connection = sqlite3.connect(self.filepath, check_same_thread=False)
+
+		with self._lock, self._connection:
+			self._connection.execute('PRAGMA journal_mode=WAL')
+			self._connection.execute('PRAGMA synchronous=NORMAL')
+			self._connection.execute(
+				'CREATE TABLE IF NOT EXISTS client_ids ('
+				'path TEXT PRIMARY KEY, '
+				'device INTEGER NOT NULL, '
+				'inode INTEGER NOT NULL, '
+				'size INTEGER NOT NULL, '
+				'mtime_ns INTEGER NOT NULL, '
+				'client_id TEXT NOT NULL, '
+				'last_used REAL NOT NULL'
+				')'
+			)
+			self._connection.execute(
+				'CREATE INDEX IF NOT EXISTS client_ids_last_used ON client_ids (last_used)'
+			)
+
+			self._count = self._connection.execute('SELECT COUNT(*) FROM client_ids').fetchone()[0]
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def __len__(self):
+		return self._count
+
+	def close(self):
+		"""Close the cache database."""
+
+		with self._lock:
+			self._connection.close()
+
+	def get(self, filepath):
+		"""Get the cached client ID of an audio file.
+
+		Parameters:
+			filepath (os.PathLike or str): The path to an audio file.
+
+		Returns:
+			str: The cached client ID, or ``None`` if missing or stale.
+		"""
+
+		try:
+			path, *identity = _file_identity(filepath)
+		except OSError:
+			return None
+
+		with self._lock, self._connection:
+			row = self._connection.execute(
+				'SELECT device, inode, size, mtime_ns, client_id FROM client_ids WHERE path = ?',
+				(path,),
+			).fetchone()
+
+			if row is None or list(row[:4]) != identity:
+				return None
+
+			self._connection.execute(
+				'UPDATE client_ids SET last_used = ? WHERE path = ?',
+				(time.time(), path),
+			)
+
+		return row[4]
+
+	def put(self, filepath, client_id):
+		"""Store the client ID of an audio file.
+
+		Parameters:
+			filepath (os.PathLike or str): The path to an audio file.
+			client_id (str): The client ID of the audio file.
+		"""
+
+		try:
+			identity = _file_identity(filepath)
+		except OSError:
+			return
+
+		with self._lock, self._connection:
+			exists = self._connection.execute(
+				'SELECT 1 FROM client_ids WHERE path = ?',
+				identity[:1],
+			).fetchone()
+
+			self._connection.execute(
+				'INSERT OR REPLACE INTO client_ids VALUES (?, ?, ?, ?, ?, ?, ?)',
+				(*identity, client_id, time.time()),
+			)
+
+			if not exists:
+				self._count += 1
+
+			if (
+				self.max_entries is not None
+				and self._count > self.max_entries
+			):
+				self._count -= self._connection.execute(
+					'DELETE FROM client_ids WHERE path IN '
+					'(SELECT path FROM client_ids ORDER BY last_used LIMIT ?)',
+					(self._count - self.max_entries,),
+				).rowcount
+
+	def invalidate(self, filepath):
+		"""Remove the cached client ID of an audio file.
+
+		Parameters:
+			filepath (os.PathLike or str): The path to an audio file.
+		"""
+
+		path = os.path.abspath(os.fspath(filepath))
+
+		with self._lock, self._connection:
+			self._count -= self._connection.execute(
+				'DELETE FROM client_ids WHERE path = ?',
+				(path,),
+			).rowcount
+
+	def clear(self):
+		"""Remove all cached client IDs."""
+
+		with self._lock, self._connection:
+			self._connection.execute('DELETE FROM client_ids')
+			self._count = 0
+
+
+@attrs(slots=True)
+class SampleCache:
+	"""A persistent cache of transcoded track samples stored as files in a directory.
+
+	Entries are keyed by client ID, sample start, sample duration, quality,
+	and whether MP3 files were sliced natively,
+	so a sample for the same challenge window of the same audio is only transcoded once.
+	Files are written atomically and samples written by other processes are found when read,
+	so a cache directory can be shared by processes.
+
+	Parameters:
+		directory (os.PathLike or str):
+			The path to the cache directory. It's created if missing.
+		max_size (int, Optional):
+			The maximum number of bytes of samples to keep.
+			The least recently used samples are evicted first.
+			Each instance enforces it over the samples it has found or stored,
+			so processes sharing a directory may briefly exceed it together.
+			Default: 256 MiB
+	"""
+
+	directory = attrib(converter=os.fspath)
+	max_size = attrib(default=256 * 1024 * 1024)
+
+	_entries = attrib(factory=OrderedDict, init=False, repr=False)
+	_lock = attrib(factory=threading.Lock, init=False, repr=False)
+	_size = attrib(default=0, init=False, repr=False)
+
+	def __attrs_post_init__(self):
+		os.makedirs(self.directory, exist_ok=True)
+
+		entries = []
+		with os.scandir(self.directory) as it:
+			for entry in it:
+				if entry.name.endswith('.mp3'):
+					try:
+						stat = entry.stat()
+					except OSError:
+						continue
+
+					entries.append((stat.st_mtime_ns, entry.name, stat.st_size))
+
+		for _, name, size in sorted(entries):
+			self._entries[name] = size
+			self._size += size
+
+		with self._lock:
+			self._evict()
+
+	def __contains__(self, key):
+		name = self._filename(*key)
+
+		return (
+			name in self._entries
+			or os.path.exists(os.path.join(self.directory, name))
+		)
+
+	def __len__(self):
+		return len(self._entries)
+
+	@property
+	def size(self):
+		"""The number of bytes of samples held."""
+
+		return self._size
+
+	@staticmethod
+	def _filename(client_id, start_millis, duration_millis, quality, native_mp3=False):
+		# Client IDs can contain characters that aren't valid in filenames.
+		# The repr keeps int and str qualities, e.g. a VBR quality of 5 and '5', apart.
+		key = repr((client_id, start_millis, duration_millis, quality, bool(native_mp3)))
+
+		return f'{md5(key.encode()).hexdigest()}.mp3'
+
+	def _remove(self, name):
+		self._size -= self._entries.pop(name)
+
+		try:
+			os.remove(os.path.join(self.directory, name))
+		except OSError:
+			pass
+
+	def _evict(self):
+		while self._size > self.max_size and self._entries:
+			self._remove(next(iter(self._entries)))
+
+	def get(self, client_id, start_millis, duration_millis, quality, *, native_mp3=False):
+		"""Get a cached sample.
+
+		Parameters:
+			client_id (str): The client ID of the audio file.
+			start_millis (int): The start of the sample in milliseconds.
+			duration_millis (int): The duration of the sample in milliseconds.
+			quality (int or str): The quality the sample was transcoded at.
+			native_mp3 (bool, Optional):
+				Whether the sample was made with ``native_mp3`` in :func:`transcode_to_mp3`.
+				Default: ``False``
+
+		Returns:
+			bytes: The MP3 data of the sample, or ``None`` if not cached.
+		"""
+
+		name = self._filename(client_id, start_millis, duration_millis, quality, native_mp3)
+		filepath = os.path.join(self.directory, name)
+
+		with self._lock:
+			known = name in self._entries
+			if known:
+				self._entries.move_to_end(name)
+
+		try:
+			with open(filepath, 'rb') as f:
+				sample = f.read()
+
+			# Persist recency for the next time the cache is opened.
+			os.utime(filepath)
+		except OSError:
+			# Not cached, or removed by another process sharing the directory.
+			if known:
+				with self._lock:
+					if name in self._entries:
+						self._size -= self._entries.pop(name)
+
+			return None
+
+		if not known:
+			# Stored by another process sharing the directory.
+			with self._lock:
+				self._size += len(sample) - self._entries.get(name, 0)
+				self._entries[name] = len(sample)
+				self._entries.move_to_end(name)
+
+				self._evict()
+
+		return sample
+
+	def put(self, client_id, start_millis, duration_millis, quality, sample, *, native_mp3=False):
+		"""Store a sample.
+
+		Parameters:
+			client_id (str): The client ID of the audio file.
+			start_millis (int): The start of the sample in milliseconds.
+			duration_millis (int): The duration of the sample in milliseconds.
+			quality (int or str): The quality the sample was transcoded at.
+			sample (bytes): The MP3 data of the sample.
+			native_mp3 (bool, Optional):
+				Whether the sample was made with ``native_mp3`` in :func:`transcode_to_mp3`.
+				Default: ``False``
+		"""
+
+		if len(sample) > self.max_size:
+			return
+
+		name = self._filename(client_id, start_millis, duration_millis, quality, native_mp3)
+
+		fd, tmp_filepath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				f.write(sample)
+
+			os.replace(tmp_filepath, os.path.join(self.directory, name))
+		except OSError:
+			try:
+				os.remove(tmp_filepath)
+			except OSError:
+				pass
+
+			return
+
+		with self._lock:
+			self._size += len(sample) - self._entries.get(name, 0)
+			self._entries[name] = len(sample)
+			self._entries.move_to_end(name)
+
+			self._evict()
+
+	def clear(self):
+		"""Remove all cached samples."""
+
+		with self._lock:
+			for name in list(self._entries):
+				self._remove(name)
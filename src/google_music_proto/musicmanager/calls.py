@@ -1,3 +1,4 @@
+import mmap
 import os
 import subprocess
 from base64 import b64encode
@@ -6,12 +7,28 @@ import audio_metadata
 import pendulum
 from attr import attrib, attrs
 
+from .cache import AlbumArtCache
+from .constants import ALBUM_ART_HASH, MAX_UPLOAD_SIZE
 from .models import MusicManagerCall
 from .pb import download_pb2, locker_pb2, upload_pb2
-from .utils import generate_client_id, get_album_art, transcode_to_mp3
+from .tags import track_info_mapper
+from .utils import (
+	PreparedSong,
+	generate_client_id,
+	get_album_art,
+	transcode_to_mp3,
+)
 from ..models import Call, JSONCall
 
 
+def _get_album_art_hash(track):
+	for additional_metadata in track.track_extras.additional_metadata:
+		if additional_metadata.tag_name == ALBUM_ART_HASH:
+			return additional_metadata.value.decode()
+
+	return None
+
+
 @attrs(slots=True)
 class ClientState(MusicManagerCall):
 	"""Get information about the state of a Google Music account.
@@ -185,17 +202,51 @@ class Metadata(MusicManagerCall):
 			track.do_not_rematch = False
 
 	@staticmethod
-	def get_track_info(song):
+	def get_track_info(song, *, cache=None, external_art=None, mapper=None, album_art_hash=False):
 		"""Create a locker track from an audio file.
 
 		Parameters:
-			song (os.PathLike or str or audio_metadata.Format):
-				The path to an audio file or an instance of :class:`audio_metadata.Format`.
+			song (os.PathLike or str or audio_metadata.Format or PreparedSong):
+				The path to an audio file, an instance of :class:`audio_metadata.Format`,
+				or an instance of :class:`PreparedSong`.
+				The locker track of a :class:`PreparedSong` is cached on it
+				and reused if ``cache``, ``external_art``, ``mapper``, and ``album_art_hash`` aren't given.
+			cache (ClientIDCache, Optional):
+				A client ID cache to consult before hashing the audio file.
+				The client ID of a :class:`PreparedSong` is stored in it if missing.
+			external_art (bytes, Optional):
+				The binary data of an external album art image
+				to hash for ``ALBUM_ART_HASH``.
+				If not provided, embedded album art will be used, if present.
+			mapper (TrackInfoMapper, Optional):
+				The mapper used to set track fields from tags.
+				Default: :data:`track_info_mapper`
+			album_art_hash (bool, Optional):
+				Add the MD5 digest of the album art to the track as ``ALBUM_ART_HASH``
+				additional metadata, for use with ``known_album_art``.
+				Default: ``False``
 
 		Returns:
 			locker_pb2.Track: A locker track of the given audio file.
 		"""
 
+		prepared = None
+		use_prepared_track = False
+		if isinstance(song, PreparedSong):
+			# A cached track may have been made with other options.
+			use_prepared_track = (
+				cache is None
+				and external_art is None
+				and mapper is None
+				and not album_art_hash
+			)
+
+			if use_prepared_track and song.track is not None:
+				return song.track
+
+			prepared = song
+			song = prepared.metadata
+
 		try:
 			if isinstance(song, audio_metadata.Format):
 				metadata = song
@@ -222,7 +273,17 @@ class Metadata(MusicManagerCall):
 		# TODO: Can probably fill more fields.
 		track = locker_pb2.Track()
 
-		track.client_id = generate_client_id(metadata)
+		if prepared is not None:
+			track.client_id = prepared.client_id
+
+			if (
+				cache is not None
+				and prepared.filepath is not None
+				and cache.get(prepared.filepath) is None
+			):
+				cache.put(prepared.filepath, track.client_id)
+		else:
+			track.client_id = generate_client_id(metadata, cache=cache)
 
 		track.original_content_type = getattr(locker_pb2.Track, content_type)
 		track.estimated_size = metadata.filesize
@@ -240,116 +301,7 @@ class Metadata(MusicManagerCall):
 		track.original_bit_rate = bitrate
 		track.duration_millis = int(metadata.streaminfo.duration * 1000)
 
-		# If 'artist'/'album'/'title' aren't provided,
-		# they render as "undefined" in the web interface.
-		# Setting them to empty strings fixes this.
-		if (
-			'artist' in metadata.tags
-			and metadata.tags.artist
-		):
-			track.artist = metadata.tags.artist[0]
-		else:
-			track.artist = ''
-
-		if (
-			'album' in metadata.tags
-			and metadata.tags.album
-		):
-			track.album = metadata.tags.album[0]
-		else:
-			track.album = ''
-
-		if (
-			'title' in metadata.tags
-			and metadata.tags.title
-		):
-			track.title = metadata.tags.title[0]
-		else:
-			try:
-				track.title = os.path.basename(song.filepath)
-			except TypeError:
-				track.title = ''
-
-		if (
-			'albumartist' in metadata.tags
-			and metadata.tags.albumartist
-		):
-			track.album_artist = metadata.tags.albumartist[0]
-
-		if (
-			'bpm' in metadata.tags
-			and metadata.tags.bpm
-		):
-			track.beats_per_minute = round(float(metadata.tags.bpm[0]))
-
-		if (
-			'composer' in metadata.tags
-			and metadata.tags.composer
-		):
-			track.composer = metadata.tags.composer[0]
-
-		if (
-			'date' in metadata.tags
-			and metadata.tags.date
-		):
-			date = metadata.tags.date[0]
-
-			try:
-				year = pendulum.parse(date).year
-			except (pendulum.exceptions.ParserError, ValueError):
-				pass
-			else:
-				track.year = year
-
-		if (
-			'genre' in metadata.tags
-			and metadata.tags.genre
-		):
-			track.genre = metadata.tags.genre[0]
-
-		if (
-			'discnumber' in metadata.tags
-			and metadata.tags.discnumber
-		):
-			disc_split = metadata.tags.discnumber[0].split('/')
-
-			try:
-				track.disc_number = int(disc_split[0])
-				if len(disc_split) == 2:
-					track.total_disc_count = int(disc_split[1])
-			except ValueError:
-				pass
-
-		if (
-			'disctotal' in metadata.tags
-			and metadata.tags.disctotal
-		):
-			try:
-				track.total_disc_count = int(metadata.tags.disctotal[0])
-			except ValueError:
-				pass
-
-		if (
-			'tracknumber' in metadata.tags
-			and metadata.tags.tracknumber
-		):
-			track_split = metadata.tags.tracknumber[0].split('/')
-
-			try:
-				track.track_number = int(track_split[0])
-				if len(track_split) == 2:
-					track.total_track_count = int(track_split[1])
-			except ValueError:
-				pass
-
-		if (
-			'tracktotal' in metadata.tags
-			and metadata.tags.tracktotal
-		):
-			try:
-				track.total_track_count = int(metadata.tags.tracktotal[0])
-			except ValueError:
-				pass
+		(mapper or track_info_mapper).apply(metadata, track)
 
 		# The track protobuf message supports an additional metadata list field.
 		# ALBUM_ART_HASH has been observed being sent in this field so far.
@@ -357,11 +309,59 @@ class Metadata(MusicManagerCall):
 		# AdditionalMetadata objects consist of two fields, 'tag_name' and 'value'.
 		additional_metadata = []
 
+		if album_art_hash:
+			if external_art:
+				digest = AlbumArtCache.digest(external_art)
+			elif prepared is not None:
+				digest = prepared.album_art_hash
+			else:
+				album_art = get_album_art(metadata)
+				digest = AlbumArtCache.digest(album_art) if album_art else None
+
+			if digest:
+				additional_metadata.append(
+					locker_pb2.AdditionalMetadata(
+						tag_name=ALBUM_ART_HASH,
+						value=digest.encode(),
+					)
+				)
+
 		if additional_metadata:
 			track.track_extras.additional_metadata.extend(additional_metadata)
 
+		if use_prepared_track:
+			prepared.track = track
+
 		return track
 
+	@staticmethod
+	def get_track_infos(songs, *, cache=None, mapper=None, album_art_hash=False):
+		"""Create locker tracks from many audio files.
+
+		Parameters:
+			songs (iterable): Songs as accepted by :meth:`get_track_info`.
+			cache (ClientIDCache, Optional):
+				A client ID cache to consult before hashing the audio files.
+			mapper (TrackInfoMapper, Optional):
+				The mapper used to set track fields from tags.
+				Default: :data:`track_info_mapper`
+			album_art_hash (bool, Optional):
+				Add ``ALBUM_ART_HASH`` additional metadata to the tracks.
+				See :meth:`get_track_info`.
+				Default: ``False``
+
+		Returns:
+			list: Locker tracks in the order of ``songs``.
+		"""
+
+		# The mapper is passed as given so tracks cached on PreparedSongs are reused by default.
+		get_track_info = Metadata.get_track_info
+
+		return [
+			get_track_info(song, cache=cache, mapper=mapper, album_art_hash=album_art_hash)
+			for song in songs
+		]
+
 
 @attrs(slots=True)
 class Sample(MusicManagerCall):
@@ -393,11 +393,24 @@ class Sample(MusicManagerCall):
 	# TODO: Improved album art API?
 	@staticmethod
 	def generate_sample(
-		song, track, sample_request, *, external_art=None, no_sample=False
+		song,
+		track,
+		sample_request,
+		*,
+		external_art=None,
+		no_sample=False,
+		album_art_cache=None,
+		known_album_art=None,
+		seek='output',
+		native_mp3=False,
+		sample_cache=None,
 	):
 		"""Generate a track sample from an audio file.
 
 		Parameters:
+			song (os.PathLike or str or audio_metadata.Format or PreparedSong):
+				The path to an audio file, an instance of :class:`audio_metadata.Format`,
+				or an instance of :class:`PreparedSong`.
 			track (locker_pb2.Track):
 				A locker track of the audio file as created by :meth:`Metadata.get_track_info`.
 			sample_request (upload_pb2.SignedChallengeInfo):
@@ -410,6 +423,27 @@ class Sample(MusicManagerCall):
 				Don't generate an audio sample from song;
 				send empty audio sample.
 				Default: Create an audio sample using ffmpeg/avconv.
+			album_art_cache (AlbumArtCache, Optional):
+				An album art cache to share album art between songs.
+				Not used for the embedded album art of a :class:`PreparedSong`,
+				which has its own.
+			known_album_art (container, Optional):
+				``ALBUM_ART_HASH`` values of album art already sent to Google Music.
+				Album art isn't sent if the ``ALBUM_ART_HASH`` of ``track`` is in it,
+				so ``track`` must be created with ``album_art_hash=True``.
+			seek (str, Optional):
+				How the transcoder seeks to the start of the sample.
+				``'input'`` is much faster for long files. See :func:`transcode_to_mp3`.
+				Default: ``'output'``
+			native_mp3 (bool, Optional):
+				Cut samples of MP3 files at or below 128 kbps at frame boundaries instead of transcoding,
+				and only transcode the frames around the sample of other MP3 files.
+				See :func:`transcode_to_mp3`.
+				Default: ``False``
+			sample_cache (SampleCache, Optional):
+				A sample cache to consult before transcoding and update after.
+				Samples are keyed by the client ID of ``track`` and the challenge window,
+				so retried uploads don't transcode samples again.
 		"""
 
 		track_sample = upload_pb2.TrackSample()
@@ -425,9 +459,24 @@ class Sample(MusicManagerCall):
 					slice_start=sample_request.challenge_info.start_millis // 1000,
 					slice_duration=sample_request.challenge_info.duration_millis // 1000,
 					quality='128k',
+					seek=seek,
+					native_mp3=native_mp3,
+					sample_cache=sample_cache,
+					client_id=track.client_id or None,
 				)
 
-			album_art = external_art or get_album_art(song)
+			if (
+				known_album_art is not None
+				and _get_album_art_hash(track) in known_album_art
+			):
+				album_art = None
+			elif isinstance(song, PreparedSong) and not external_art:
+				album_art = song.album_art
+			else:
+				album_art = external_art or get_album_art(song)
+
+				if album_art and album_art_cache is not None:
+					album_art = album_art_cache.put(album_art)
 
 			if album_art:
 				album_art_image = upload_pb2.ImageUnion()
@@ -457,8 +506,9 @@ class ScottyAgentPost(JSONCall):
 			in the response of :class:`Metadata` or :class:`Sample`.
 		track (locker_pb2.Track):
 			A locker track of the audio file as created by :meth:`Metadata.get_track_info`.
-		song (os.PathLike or str or audio_metadata.Format):
-			The path to an audio file or an instance of :class:`audio_metadata.Format`.
+		song (os.PathLike or str or audio_metadata.Format or PreparedSong):
+			The path to an audio file, an instance of :class:`audio_metadata.Format`,
+			or an instance of :class:`PreparedSong`.
 		external_art(bytes, Optional):
 			The binary data of an external album art image.
 			If not provided, embedded album art will be used, if present.
@@ -468,6 +518,14 @@ class ScottyAgentPost(JSONCall):
 		total_uploaded_count (int, Optional):
 			Number of songs uploaded in this session.
 			Default: 0
+		album_art_cache (AlbumArtCache, Optional):
+			An album art cache to share the base64-encoded album art between songs.
+			Not used for the embedded album art of a :class:`PreparedSong`,
+			which has its own.
+		known_album_art (container, Optional):
+			``ALBUM_ART_HASH`` values of album art already sent to Google Music.
+			Album art isn't sent if the ``ALBUM_ART_HASH`` of ``track`` is in it,
+			so ``track`` must be created with ``album_art_hash=True``.
 	"""
 
 	base_url = 'https://uploadsj.clients.google.com/uploadsj/scottyagent'
@@ -480,6 +538,8 @@ class ScottyAgentPost(JSONCall):
 	external_art = attrib(default=None)
 	total_song_count = attrib(default=1)
 	total_uploaded_count = attrib(default=0)
+	album_art_cache = attrib(default=None)
+	known_album_art = attrib(default=None)
 
 	def __attrs_post_init__(self):
 		super().__attrs_post_init__()
@@ -498,13 +558,33 @@ class ScottyAgentPost(JSONCall):
 			'UploaderId': self.uploader_id,
 		}
 
-		if not isinstance(self.song, audio_metadata.Format):
-			self.song = audio_metadata.load(self.song)
+		if isinstance(self.song, (str, os.PathLike)):
+			filepath = os.fspath(self.song)
+		else:
+			if not isinstance(self.song, (PreparedSong, audio_metadata.Format)):
+				self.song = audio_metadata.load(self.song)
 
-		album_art = self.external_art or get_album_art(self.song)
+			filepath = self.song.filepath
 
-		if album_art:
-			inlined['AlbumArt'] = b64encode(album_art).decode()
+		if (
+			self.known_album_art is not None
+			and _get_album_art_hash(self.track) in self.known_album_art
+		):
+			album_art_b64 = None
+		elif isinstance(self.song, PreparedSong) and not self.external_art:
+			album_art_b64 = self.song.album_art_b64
+		else:
+			album_art = self.external_art or get_album_art(self.song)
+
+			if not album_art:
+				album_art_b64 = None
+			elif self.album_art_cache is not None:
+				album_art_b64 = self.album_art_cache.b64encode(album_art)
+			else:
+				album_art_b64 = b64encode(album_art).decode()
+
+		if album_art_b64:
+			inlined['AlbumArt'] = album_art_b64
 
 		self._data.update(
 			{
@@ -513,8 +593,8 @@ class ScottyAgentPost(JSONCall):
 					'fields': [
 						{
 							'external': {
-								'filename': os.path.basename(self.song.filepath),
-								'name': os.path.abspath(self.song.filepath),
+								'filename': os.path.basename(filepath),
+								'name': os.path.abspath(filepath),
 								'put': {},
 								# Size seems to be sent when uploading MP3, but not FLAC.
 								# In fact, uploading FLAC directly fails when this is given.
@@ -548,12 +628,19 @@ class ScottyAgentPut(Call):
 	Parameters:
 		upload_url (str):
 			The upload URL given by :class:`ScottyAgentPost` response.
-		audio_file (os.PathLike or str or bytes):
+		audio_file (os.PathLike or str or bytes or mmap.mmap):
 			An audio file as :class:`os.PathLike`,
 			a file/bytes-like object, or binary data.
+			A :class:`mmap.mmap`, e.g. from :func:`transcode_to_mp3` with ``spool_size``,
+			is sent without copying it into memory.
 		content_type (str):
 			The mime type to be sent in the ContentType header field.
 			Default: ``'audio/mpeg'``
+		stream (bool, Optional):
+			Make the body an iterator of chunks read from ``audio_file`` as it's sent
+			instead of reading it all into memory, e.g. for a :class:`TranscodeStream`.
+			The maximum file size is then checked while reading.
+			Default: ``False``
 	"""
 
 	method = 'PUT'
@@ -561,26 +648,57 @@ class ScottyAgentPut(Call):
 	upload_url = attrib()
 	audio_file = attrib()
 	content_type = attrib(default='audio/mpeg')
+	stream = attrib(default=False)
 
 	def __attrs_post_init__(self):
-		if hasattr(self.audio_file, 'read'):
-			self._data = self.audio_file.read()
-		elif isinstance(self.audio_file, (os.PathLike, str)):
-			with open(self.audio_file, 'rb') as f:
-				self._data = f.read()
-		elif isinstance(self.audio_file, bytes):
-			self._data = self.audio_file
-		else:
+		if (
+			not isinstance(self.audio_file, (os.PathLike, str, bytes))
+			and not hasattr(self.audio_file, 'read')
+		):
 			raise ValueError(
 				"'audio_file' must be os.PathLike, filepath string, a file/bytes-like object, or binary data."
 			)
 
-		if len(self._data) >= 300 * 1024 * 1024:
-			raise ValueError("Maximum allowed file size is 300 MiB.")
+		if (
+			self.stream
+			and not isinstance(self.audio_file, (bytes, mmap.mmap))
+		):
+			self._data = self._iter_chunks()
+		else:
+			if isinstance(self.audio_file, mmap.mmap):
+				self._data = self.audio_file
+			elif hasattr(self.audio_file, 'read'):
+				self._data = self.audio_file.read()
+			elif isinstance(self.audio_file, (os.PathLike, str)):
+				with open(self.audio_file, 'rb') as f:
+					self._data = f.read()
+			else:
+				self._data = self.audio_file
+
+			if len(self._data) >= MAX_UPLOAD_SIZE:
+				raise ValueError("Maximum allowed file size is 300 MiB.")
 
 		self._headers.update({'ContentType': self.content_type})
 		self._url = self.upload_url
 
+	def _iter_chunks(self):
+		if hasattr(self.audio_file, 'read'):
+			audio_file = self.audio_file
+		else:
+			audio_file = open(self.audio_file, 'rb')
+
+		size = 0
+		try:
+			for chunk in iter(lambda: audio_file.read(64 * 1024), b''):
+				size += len(chunk)
+				if size >= MAX_UPLOAD_SIZE:
+					raise ValueError("Maximum allowed file size is 300 MiB.")
+
+				yield chunk
+		finally:
+			if audio_file is not self.audio_file:
+				audio_file.close()
+
 	parse_response = JSONCall.parse_response
 
 
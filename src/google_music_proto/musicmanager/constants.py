@@ -1,3 +1,5 @@
-__all__ = ['API_URL']
+__all__ = ['ALBUM_ART_HASH', 'API_URL', 'MAX_UPLOAD_SIZE']
 
+ALBUM_ART_HASH = 'ALBUM_ART_HASH'
 API_URL = 'https://android.clients.google.com/upsj'
+MAX_UPLOAD_SIZE = 300 * 1024 * 1024
@@ -0,0 +1,378 @@
+__all__ = [
+	'AUDIO_EXTENSIONS',
+	'ClientIDIndex',
+	'ScanManifest',
+	'scan_library',
+]
+
+import json
+import os
+
+from attr import attrib, attrs
+
+from .calls import Metadata
+from .pb import locker_pb2
+from .utils import _imap_unordered
+
+AUDIO_EXTENSIONS = frozenset(
+	[
+		'.flac',
+		'.mp3',
+		'.oga',
+		'.ogg',
+		'.opus',
+		'.wav',
+	]
+)
+
+
+@attrs(slots=True)
+class ScanManifest:
+	"""A record of the size and modification time of scanned audio files.
+
+	Used by :func:`scan_library` to skip files unchanged since a previous scan.
+
+	Parameters:
+		entries (dict, Optional):
+			A mapping of absolute file paths to ``(size, mtime_ns)`` pairs.
+	"""
+
+	entries = attrib(factory=dict)
+
+	@classmethod
+	def load(cls, filepath):
+		"""Load a manifest from a JSON file.
+
+		Parameters:
+			filepath (os.PathLike or str): The path to a manifest file.
+				A missing file gives an empty manifest.
+		"""
+
+		try:
+			with open(filepath) as f:
+				entries = json.load(f)
+		except FileNotFoundError:
+			entries = {}
+
+		return cls(
+			{
+				path: tuple(identity)
+				for path, identity in entries.items()
+			}
+		)
+
+	def save(self, filepath):
+		"""Save the manifest to a JSON file.
+
+		Parameters:
+			filepath (os.PathLike or str): The path to a manifest file.
+		"""
+
+		tmp_filepath = f'{os.fspath(filepath)}.tmp'
+		with open(tmp_filepath, 'w') as f:
+			json.dump(self.entries, f)
+
+		os.replace(tmp_filepath, filepath)
+
+	def is_unchanged(self, path, stat):
+		"""Check if a file matches its entry in the manifest.
+
+		Parameters:
+			path (str): The absolute path to a file.
+			stat (os.stat_result): The result of :func:`os.stat` for the file.
+		"""
+
+		return self.entries.get(path) == (stat.st_size, stat.st_mtime_ns)
+
+	def update(self, path, stat):
+		"""Record a file in the manifest.
+
+		Parameters:
+			path (str): The absolute path to a file.
+			stat (os.stat_result): The result of :func:`os.stat` for the file.
+		"""
+
+		self.entries[path] = (stat.st_size, stat.st_mtime_ns)
+
+
+@attrs(slots=True)
+class ClientIDIndex:
+	"""An index of local audio files by client ID.
+
+	Byte-identical audio streams have the same client ID regardless of tags or path,
+	so only one representative of each client ID needs to be uploaded.
+	A path is only indexed under its most recently added client ID.
+
+	Parameters:
+		paths (dict, Optional):
+			A mapping of client IDs to sets of absolute file paths.
+	"""
+
+	paths = attrib(factory=dict)
+
+	_client_ids = attrib(factory=dict, init=False, repr=False)
+
+	def __attrs_post_init__(self):
+		for client_id, paths in self.paths.items():
+			for path in paths:
+				self._client_ids[path] = client_id
+
+	def __contains__(self, client_id):
+		return client_id in self.paths
+
+	def __iter__(self):
+		return iter(self.paths)
+
+	def __len__(self):
+		return len(self.paths)
+
+	@classmethod
+	def load(cls, filepath):
+		"""Load an index from a JSON file.
+
+		Parameters:
+			filepath (os.PathLike or str): The path to an index file.
+				A missing file gives an empty index.
+		"""
+
+		try:
+			with open(filepath) as f:
+				paths = json.load(f)
+		except FileNotFoundError:
+			paths = {}
+
+		return cls(
+			{
+				client_id: set(client_id_paths)
+				for client_id, client_id_paths in paths.items()
+			}
+		)
+
+	def save(self, filepath):
+		"""Save the index to a JSON file.
+
+		Parameters:
+			filepath (os.PathLike or str): The path to an index file.
+		"""
+
+		tmp_filepath = f'{os.fspath(filepath)}.tmp'
+		with open(tmp_filepath, 'w') as f:
+			json.dump(
+				{
+					client_id: sorted(paths)
+					for client_id, paths in self.paths.items()
+				},
+				f,
+			)
+
+		os.replace(tmp_filepath, filepath)
+
+	def add(self, client_id, path):
+		"""Add a file to the index.
+
+		Parameters:
+			client_id (str): The client ID of the file.
+			path (os.PathLike or str): The path to the file.
+		"""
+
+		path = os.path.abspath(os.fspath(path))
+
+		self.remove(path)
+		self.paths.setdefault(client_id, set()).add(path)
+		self._client_ids[path] = client_id
+
+	def remove(self, path):
+		"""Remove a file from the index.
+
+		Parameters:
+			path (os.PathLike or str): The path to the file.
+		"""
+
+		path = os.path.abspath(os.fspath(path))
+
+		client_id = self._client_ids.pop(path, None)
+		if client_id is not None:
+			paths = self.paths[client_id]
+			paths.discard(path)
+
+			if not paths:
+				del self.paths[client_id]
+
+	def update(self, results):
+		"""Add files to the index from :func:`scan_library` results.
+
+		Failed results are skipped.
+
+		Parameters:
+			results (iterable): ``(path, locker_pb2.Track)`` pairs.
+		"""
+
+		for _ in self.index_results(results):
+			pass
+
+	def index_results(self, results):
+		"""Add files to the index from :func:`scan_library` results as they're consumed.
+
+		Failed results are skipped.
+
+		Parameters:
+			results (iterable): ``(path, locker_pb2.Track)`` pairs.
+
+		Yields:
+			tuple: Each ``(path, locker_pb2.Track)`` pair in ``results``,
+			after it's added to the index.
+		"""
+
+		for path, track in results:
+			if not isinstance(track, Exception):
+				self.add(track.client_id, path)
+
+			yield path, track
+
+	def merge(self, other):
+		"""Add all files from another index.
+
+		Entries in ``other`` take precedence for paths in both indexes.
+
+		Parameters:
+			other (ClientIDIndex): The index to merge.
+		"""
+
+		for client_id, paths in other.paths.items():
+			for path in paths:
+				self.add(client_id, path)
+
+	def get_client_id(self, path):
+		"""Get the client ID a file is indexed under.
+
+		Parameters:
+			path (os.PathLike or str): The path to the file.
+
+		Returns:
+			str: The client ID, or ``None`` if not indexed.
+		"""
+
+		return self._client_ids.get(os.path.abspath(os.fspath(path)))
+
+	def duplicates(self):
+		"""Get the client IDs of audio indexed under more than one path.
+
+		Returns:
+			dict: A mapping of client IDs to sets of paths.
+		"""
+
+		return {
+			client_id: paths
+			for client_id, paths in self.paths.items()
+			if len(paths) > 1
+		}
+
+	def representatives(self):
+		"""Get one path for each client ID.
+
+		The first path in sorted order is chosen so the choice is stable across runs.
+
+		Returns:
+			dict: A mapping of client IDs to paths.
+		"""
+
+		return {
+			client_id: min(paths)
+			for client_id, paths in self.paths.items()
+		}
+
+
+def _serialize_track_info(filepath):
+	# Generated protobuf classes can't be pickled between processes.
+	return Metadata.get_track_info(filepath).SerializeToString()
+
+
+def _walk(paths, extensions):
+	for path in paths:
+		path = os.path.abspath(os.fspath(path))
+
+		if os.path.isdir(path):
+			for dirpath, _, filenames in os.walk(path):
+				for filename in filenames:
+					if os.path.splitext(filename)[1].lower() in extensions:
+						yield os.path.join(dirpath, filename)
+		else:
+			yield path
+
+
+def scan_library(
+	paths, *, workers=None, chunksize=8, max_pending=None, manifest=None, extensions=AUDIO_EXTENSIONS
+):
+	"""Lazily create locker tracks for audio files in directories.
+
+	Files are processed in a pool of processes and results are yielded
+	in the order they complete, so only ``max_pending`` files
+	and their locker tracks are held in memory at once.
+	If a locker track can't be created for a file,
+	the exception raised is yielded in place of the locker track.
+
+	Parameters:
+		paths (os.PathLike or str or iterable):
+			Directories to walk and/or audio files to process.
+		workers (int, Optional):
+			The number of worker processes to use.
+			Default: The number of CPUs on the machine.
+		chunksize (int, Optional):
+			The number of audio files sent to a worker process at a time.
+			Default: ``8``
+		max_pending (int, Optional):
+			The maximum number of audio files being processed at once.
+			Default: ``2 * workers * chunksize``
+		manifest (ScanManifest, Optional):
+			The manifest of a previous scan.
+			Files with the same size and modification time are skipped.
+			The manifest is updated with each file successfully processed.
+		extensions (set, Optional):
+			File extensions of audio files to process when walking directories.
+			Default: :data:`AUDIO_EXTENSIONS`
+
+	Yields:
+		tuple: A ``(path, locker_pb2.Track)`` pair for each audio file.
+	"""
+
+	if isinstance(paths, (str, os.PathLike)):
+		paths = [paths]
+
+	stats = {}
+
+	def _changed(filepaths):
+		for filepath in filepaths:
+			try:
+				stat = os.stat(filepath)
+			except OSError:
+				# Let the error be reported with the results.
+				yield filepath
+				continue
+
+			if not manifest.is_unchanged(filepath, stat):
+				stats[filepath] = stat
+				yield filepath
+
+	filepaths = _walk(paths, extensions)
+	if manifest is not None:
+		filepaths = _changed(filepaths)
+
+	results = _imap_unordered(
+		_serialize_track_info,
+		filepaths,
+		workers=workers,
+		chunksize=chunksize,
+		max_pending=max_pending,
+	)
+	for filepath, track in results:
+		if not isinstance(track, Exception):
+			track = locker_pb2.Track.FromString(track)
+
+		stat = stats.pop(filepath, None)
+		if (
+			stat is not None
+			and not isinstance(track, Exception)
+		):
+			manifest.update(filepath, stat)
+
+		yield filepath, track
@@ -0,0 +1,227 @@
+__all__ = [
+	'TranscodeScheduler',
+	'TranscodeStats',
+]
+
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from attr import attrib, attrs, evolve
+
+from .calls import Sample
+from .utils import transcode_to_mp3
+
+
+@attrs(slots=True, frozen=True)
+class TranscodeStats:
+	"""Aggregate statistics of a :class:`TranscodeScheduler`.
+
+	Attributes:
+		submitted (int): The number of jobs submitted.
+		completed (int): The number of jobs that returned a result.
+		failed (int): The number of jobs that raised an exception.
+		cancelled (int): The number of jobs cancelled before they started.
+		queue_wait (float): The total seconds jobs waited in the queue.
+		encode_time (float): The total seconds jobs spent running.
+		max_queue_wait (float): The longest seconds a job waited in the queue.
+	"""
+
+	submitted = attrib(default=0)
+	completed = attrib(default=0)
+	failed = attrib(default=0)
+	cancelled = attrib(default=0)
+	queue_wait = attrib(default=0.0)
+	encode_time = attrib(default=0.0)
+	max_queue_wait = attrib(default=0.0)
+
+	@property
+	def finished(self):
+		"""The number of jobs that ran to completion or failure."""
+
+		return self.completed + self.failed
+
+	@property
+	def mean_queue_wait(self):
+		"""The mean seconds a finished job waited in the queue."""
+
+		return self.queue_wait / self.finished if self.finished else 0.0
+
+	@property
+	def mean_encode_time(self):
+		"""The mean seconds a finished job spent running."""
+
+		return self.encode_time / self.finished if self.finished else 0.0
+
+
+@attrs(slots=True)
+class TranscodeScheduler:
+	"""Run transcodes with a bounded number of concurrent transcoder processes.
+
+	Jobs are queued and run in order of priority, lowest first,
+	then in the order they were submitted.
+
+	Parameters:
+		max_workers (int, Optional):
+			The maximum number of transcodes to run at once.
+			Default: The number of CPUs on the machine.
+	"""
+
+	max_workers = attrib(default=None)
+
+	_counter = attrib(factory=itertools.count, init=False, repr=False)
+	_lock = attrib(factory=threading.Lock, init=False, repr=False)
+	_queue = attrib(factory=queue.PriorityQueue, init=False, repr=False)
+	_shutdown = attrib(default=False, init=False, repr=False)
+	_stats = attrib(factory=TranscodeStats, init=False, repr=False)
+	_threads = attrib(factory=list, init=False, repr=False)
+
+	def __attrs_post_init__(self):
+		if self.max_workers is None:
+			self.max_workers = os.cpu_count() or 1
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.shutdown()
+
+	@property
+	def stats(self):
+		"""TranscodeStats: A snapshot of the scheduler's statistics."""
+
+		with self._lock:
+			return self._stats
+
+	def _worker(self):
+		while True:
+			_, _, job = self._queue.get()
+
+			if job is None:
+				break
+
+			future, submitted, func, args, kwargs = job
+
+			if not future.set_running_or_notify_cancel():
+				with self._lock:
+					self._stats = evolve(self._stats, cancelled=self._stats.cancelled + 1)
+
+				continue
+
+			started = time.perf_counter()
+
+			try:
+				result = func(*args, **kwargs)
+			except BaseException as e:
+				exception = e
+			else:
+				exception = None
+
+			finished = time.perf_counter()
+			queue_wait = started - submitted
+
+			with self._lock:
+				stats = self._stats
+				self._stats = evolve(
+					stats,
+					completed=stats.completed + (exception is None),
+					failed=stats.failed + (exception is not None),
+					queue_wait=stats.queue_wait + queue_wait,
+					encode_time=stats.encode_time + (finished - started),
+					max_queue_wait=max(stats.max_queue_wait, queue_wait),
+				)
+
+			if exception is None:
+				future.set_result(result)
+			else:
+				future.set_exception(exception)
+
+	def submit(self, func, *args, priority=0, **kwargs):
+		"""Queue a call to run with a bounded number of other calls.
+
+		Parameters:
+			func (callable): The callable to run.
+			*args: Positional arguments for ``func``.
+			priority (int, Optional):
+				Jobs with lower priority values run first.
+				Default: ``0``
+			**kwargs: Keyword arguments for ``func``.
+
+		Returns:
+			concurrent.futures.Future: The future result of ``func``.
+		"""
+
+		future = Future()
+
+		with self._lock:
+			if self._shutdown:
+				raise RuntimeError("Cannot submit jobs after shutdown.")
+
+			if len(self._threads) < self.max_workers:
+				thread = threading.Thread(target=self._worker, daemon=True)
+				thread.start()
+				self._threads.append(thread)
+
+			self._stats = evolve(self._stats, submitted=self._stats.submitted + 1)
+
+			self._queue.put(
+				(
+					priority,
+					next(self._counter),
+					(future, time.perf_counter(), func, args, kwargs),
+				)
+			)
+
+		return future
+
+	def transcode_to_mp3(self, song, *, priority=0, **kwargs):
+		"""Queue :func:`transcode_to_mp3`.
+
+		Returns:
+			concurrent.futures.Future: The future transcoded MP3 data.
+		"""
+
+		return self.submit(transcode_to_mp3, song, priority=priority, **kwargs)
+
+	def generate_sample(self, song, track, sample_request, *, priority=0, **kwargs):
+		"""Queue :meth:`Sample.generate_sample`.
+
+		Returns:
+			concurrent.futures.Future: The future track sample.
+		"""
+
+		return self.submit(
+			Sample.generate_sample,
+			song,
+			track,
+			sample_request,
+			priority=priority,
+			**kwargs,
+		)
+
+	def shutdown(self, wait=True):
+		"""Stop accepting jobs and stop the workers once queued jobs are finished.
+
+		Parameters:
+			wait (bool, Optional):
+				Wait for queued jobs to finish.
+				Default: ``True``
+		"""
+
+		with self._lock:
+			if self._shutdown:
+				threads = []
+			else:
+				self._shutdown = True
+				threads = list(self._threads)
+
+				# Sorts after every job so queued jobs finish before workers stop.
+				for _ in threads:
+					self._queue.put((float('inf'), next(self._counter), None))
+
+		if wait:
+			for thread in threads:
+				thread.join()
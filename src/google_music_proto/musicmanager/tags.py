@@ -0,0 +1,253 @@
+__all__ = [
+	'DEFAULT_TAG_MAPPINGS',
+	'TagMapping',
+	'TrackInfoMapper',
+	'parse_number_total',
+	'parse_year',
+	'track_info_mapper',
+]
+
+import datetime
+import functools
+import os
+import re
+
+import pendulum
+from attr import attrib, attrs
+
+
+def _first(values):
+	return values[0]
+
+
+def _parse_int(values):
+	return int(values[0])
+
+
+def _parse_bpm(values):
+	return round(float(values[0]))
+
+
+# YYYY, YYYY-MM, or YYYY-MM-DD.
+_DATE_RE = re.compile(r'(\d{4})(?:-(\d{2})(?:-(\d{2}))?)?')
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_year(date):
+	"""Get the year of a date tag.
+
+	The common ``YYYY``, ``YYYY-MM``, and ``YYYY-MM-DD`` forms are parsed directly.
+	Other forms are parsed with :func:`pendulum.parse`.
+	Results are memoized, as tracks of an album share the same date.
+
+	Parameters:
+		date (str): The value of a date tag.
+
+	Returns:
+		int: The year, or ``None`` if ``date`` isn't a valid date.
+	"""
+
+	match = _DATE_RE.fullmatch(date)
+	if match is not None:
+		year, month, day = match.groups()
+
+		try:
+			datetime.date(int(year), int(month or 1), int(day or 1))
+		except ValueError:
+			return None
+
+		return int(year)
+
+	try:
+		return getattr(pendulum.parse(date), 'year', None)
+	except (pendulum.exceptions.ParserError, ValueError):
+		return None
+
+
+def _parse_year(values):
+	year = parse_year(values[0])
+	if year is None:
+		raise ValueError(values[0])
+
+	return year
+
+
+def parse_number_total(values):
+	"""Parse a number tag of the form ``'n'`` or ``'n/total'``.
+
+	Parameters:
+		values (list): The values of a tag, e.g. ``['1/12']``.
+
+	Returns:
+		tuple: The number and the total, or ``None`` for a missing or invalid total.
+
+	Raises:
+		ValueError: If the number isn't an integer.
+	"""
+
+	split = values[0].split('/')
+	number = int(split[0])
+
+	total = None
+	if len(split) == 2:
+		try:
+			total = int(split[1])
+		except ValueError:
+			pass
+
+	return number, total
+
+
+def _empty_string(metadata):
+	return ''
+
+
+def _default_title(metadata):
+	try:
+		return os.path.basename(metadata.filepath)
+	except TypeError:
+		return ''
+
+
+@attrs(slots=True, frozen=True)
+class TagMapping:
+	"""A mapping of an audio tag to fields of a :class:`locker_pb2.Track`.
+
+	Parameters:
+		tag (str): The name of the tag in :attr:`audio_metadata.Format.tags`.
+		field (str or tuple):
+			The name of the track field to set,
+			or a tuple of names to set from a tuple returned by ``convert``.
+		convert (callable, Optional):
+			Called with the list of tag values to get the field value(s).
+			Values of ``None`` are skipped.
+			If it raises :exc:`ValueError`, the tag is skipped.
+			Default: The first tag value.
+		default (callable, Optional):
+			Called with the :class:`audio_metadata.Format`
+			to get the field value when the tag is missing, empty, or invalid.
+			Default: Leave the field unset.
+	"""
+
+	tag = attrib()
+	field = attrib()
+	convert = attrib(default=_first)
+	default = attrib(default=None)
+
+
+DEFAULT_TAG_MAPPINGS = (
+	# If 'artist'/'album'/'title' aren't provided,
+	# they render as "undefined" in the web interface.
+	# Setting them to empty strings fixes this.
+	TagMapping('artist', 'artist', default=_empty_string),
+	TagMapping('album', 'album', default=_empty_string),
+	TagMapping('title', 'title', default=_default_title),
+	TagMapping('albumartist', 'album_artist'),
+	TagMapping('bpm', 'beats_per_minute', _parse_bpm),
+	TagMapping('composer', 'composer'),
+	TagMapping('date', 'year', _parse_year),
+	TagMapping('genre', 'genre'),
+	TagMapping('discnumber', ('disc_number', 'total_disc_count'), parse_number_total),
+	TagMapping('disctotal', 'total_disc_count', _parse_int),
+	TagMapping('tracknumber', ('track_number', 'total_track_count'), parse_number_total),
+	TagMapping('tracktotal', 'total_track_count', _parse_int),
+)
+
+
+@attrs(slots=True, frozen=True)
+class TrackInfoMapper:
+	"""Set :class:`locker_pb2.Track` fields from audio tags.
+
+	The mappings are compiled once into a flat list of steps,
+	so converting a track is a dict lookup and a field assignment per tag.
+	Mappings are applied in order, so later mappings override fields set by earlier ones.
+
+	Parameters:
+		mappings (iterable, Optional):
+			The :class:`TagMapping` instances to apply.
+			Default: :data:`DEFAULT_TAG_MAPPINGS`
+	"""
+
+	mappings = attrib(default=DEFAULT_TAG_MAPPINGS, converter=tuple)
+
+	_steps = attrib(init=False, repr=False, cmp=False)
+
+	def __attrs_post_init__(self):
+		object.__setattr__(self, '_steps', tuple(self._compile(mapping) for mapping in self.mappings))
+
+	@staticmethod
+	def _compile(mapping):
+		if isinstance(mapping.field, str):
+			field = mapping.field
+
+			def set_fields(track, value):
+				if value is not None:
+					setattr(track, field, value)
+		else:
+			fields = tuple(mapping.field)
+
+			def set_fields(track, values):
+				for field, value in zip(fields, values):
+					if value is not None:
+						setattr(track, field, value)
+
+		return mapping.tag, mapping.convert, mapping.default, set_fields
+
+	def extend(self, mappings):
+		"""Create a mapper with additional mappings applied after these.
+
+		Parameters:
+			mappings (iterable): The :class:`TagMapping` instances to add.
+
+		Returns:
+			TrackInfoMapper: A new mapper.
+		"""
+
+		return self.__class__(self.mappings + tuple(mappings))
+
+	def apply(self, metadata, track):
+		"""Set track fields from the tags of an audio file.
+
+		Parameters:
+			metadata (audio_metadata.Format): The metadata of an audio file.
+			track (locker_pb2.Track): The locker track to update.
+
+		Returns:
+			locker_pb2.Track: ``track``.
+		"""
+
+		get_tag = metadata.tags.get
+
+		for tag, convert, default, set_fields in self._steps:
+			values = get_tag(tag)
+
+			if values:
+				try:
+					set_fields(track, convert(values))
+				except ValueError:
+					pass
+				else:
+					continue
+
+			if default is not None:
+				set_fields(track, default(metadata))
+
+		return track
+
+	def apply_many(self, pairs):
+		"""Set track fields from the tags of many audio files.
+
+		Parameters:
+			pairs (iterable): ``(audio_metadata.Format, locker_pb2.Track)`` pairs.
+
+		Returns:
+			list: The updated locker tracks.
+		"""
+
+		apply = self.apply
+
+		return [apply(metadata, track) for metadata, track in pairs]
+
+
+#: TrackInfoMapper: The mapper used by :meth:`Metadata.get_track_info` by default.
+track_info_mapper = TrackInfoMapper()
@@ -1,19 +1,571 @@
 __all__ = [
+	'ClientIDHasher',
+	'FFmpegBackend',
+	'LAMEBackend',
+	'PreparedSong',
+	'TranscodeBackend',
+	'TranscodeStream',
+	'TranscodeTiming',
+	'Transcoder',
+	'TranscoderRegistry',
 	'generate_client_id',
+	'generate_client_ids',
 	'get_album_art',
 	'get_transcoder',
+	'slice_mp3',
+	'transcode_backends',
 	'transcode_to_mp3',
+	'transcode_to_mp3_stream',
+	'transcoders',
 ]
 
+import io
+import math
+import mmap
 import os
+import re
 import shutil
+import struct
 import subprocess
+import tempfile
+import threading
+import time
+import wave
 from base64 import b64encode
 from binascii import unhexlify
+from concurrent.futures import (
+	FIRST_COMPLETED,
+	ProcessPoolExecutor,
+	wait,
+)
 from hashlib import md5
 
 import audio_metadata
-from tbm_utils import DataReader
+from attr import attrib, attrs
+
+from .cache import AlbumArtCache
+
+try:
+	import lameenc
+except ImportError:  # pragma: nocover
+	lameenc = None
+
+try:
+	import resource
+except ImportError:  # pragma: nocover
+	resource = None
+
+try:
+	import soundfile
+except ImportError:  # pragma: nocover
+	soundfile = None
+
+_MISSING = object()
+
+
+def _load_metadata(song):
+	if isinstance(song, PreparedSong):
+		return song.metadata
+	elif isinstance(song, audio_metadata.Format):
+		return song
+	else:
+		return audio_metadata.load(song)
+
+
+@attrs(slots=True)
+class PreparedSong:
+	"""An audio file parsed once to be shared between upload calls.
+
+	Metadata is loaded on creation.
+	The client ID, album art, and locker track are computed on first use and cached.
+
+	Can be given in place of an audio file to :meth:`Metadata.get_track_info`,
+	:meth:`Sample.generate_sample`, and :class:`ScottyAgentPost`.
+
+	Parameters:
+		song (os.PathLike or str or audio_metadata.Format):
+			The path to an audio file or an instance of :class:`audio_metadata.Format`.
+		external_art (bytes, Optional):
+			The binary data of an external album art image.
+			If not provided, embedded album art will be used, if present.
+		cache (ClientIDCache, Optional):
+			A client ID cache to consult before hashing the audio file.
+		album_art_cache (AlbumArtCache, Optional):
+			An album art cache to share album art and its base64 encoding
+			with other songs, e.g. tracks of the same album.
+	"""
+
+	metadata = attrib(converter=_load_metadata)
+	external_art = attrib(default=None)
+	cache = attrib(default=None)
+	album_art_cache = attrib(default=None)
+
+	track = attrib(default=None, init=False)
+	_client_id = attrib(default=None, init=False)
+	_album_art = attrib(default=_MISSING, init=False)
+	_album_art_b64 = attrib(default=_MISSING, init=False)
+	_album_art_hash = attrib(default=None, init=False)
+
+	@property
+	def filepath(self):
+		"""The path of the audio file."""
+
+		return self.metadata.filepath
+
+	@property
+	def client_id(self):
+		"""The client ID of the audio file."""
+
+		if self._client_id is None:
+			self._client_id = generate_client_id(self.metadata, cache=self.cache)
+
+		return self._client_id
+
+	@property
+	def album_art(self):
+		"""The external album art if given, else the selected embedded album art."""
+
+		if self._album_art is _MISSING:
+			album_art = self.external_art or get_album_art(self.metadata)
+
+			# The digest is computed once and shared by the cache and ALBUM_ART_HASH.
+			if album_art:
+				self._album_art_hash = AlbumArtCache.digest(album_art)
+
+				if self.album_art_cache is not None:
+					album_art = self.album_art_cache.put(album_art, digest=self._album_art_hash)
+			else:
+				self._album_art_hash = None
+
+			self._album_art = album_art
+
+		return self._album_art
+
+	@property
+	def album_art_b64(self):
+		"""The album art as base64-encoded text."""
+
+		if self._album_art_b64 is _MISSING:
+			album_art = self.album_art
+
+			if not album_art:
+				self._album_art_b64 = None
+			elif self.album_art_cache is not None:
+				self._album_art_b64 = self.album_art_cache.b64encode(
+					album_art,
+					digest=self.album_art_hash,
+				)
+			else:
+				self._album_art_b64 = b64encode(album_art).decode()
+
+		return self._album_art_b64
+
+	@property
+	def album_art_hash(self):
+		"""The hex MD5 digest of the album art as sent in ``ALBUM_ART_HASH``."""
+
+		# Set along with the album art.
+		self.album_art
+
+		return self._album_art_hash
+
+
+# Same as the amount audio-metadata searches for MP3 end tags (ID3v1, APEv2, Lyrics3).
+_END_TAG_SEARCH_SIZE = 64 * 1024
+
+
+def _find_end_tag_offset(end_buffer):
+	end_tag_offset = 0
+	for tag_type in [b'APETAGEX', b'LYRICSBEGIN', b'TAG']:
+		tag_offset = end_buffer.rfind(tag_type)
+
+		if tag_offset > 0:
+			tag_offset = len(end_buffer) - tag_offset
+
+			if tag_offset > end_tag_offset:
+				end_tag_offset = tag_offset
+
+	return end_tag_offset
+
+
+@attrs(slots=True)
+class ClientIDHasher:
+	"""Incrementally generate a client ID from audio data.
+
+	Follows the same rules as :func:`generate_client_id`
+	so audio data can be hashed as it is received
+	without first being written to a file.
+
+	Supports FLAC, MP3, MP4, Ogg Opus, Ogg Vorbis, and WAVE audio.
+
+	Example::
+
+		>>> hasher = ClientIDHasher()
+		>>> for chunk in chunks:
+		...     hasher.update(chunk)
+		>>> client_id = hasher.finalize()
+	"""
+
+	_format = attrib(default=None, init=False)
+	_md5 = attrib(factory=md5, init=False, repr=False)
+	_md5sum = attrib(default=None, init=False, repr=False)
+	_client_id = attrib(default=None, init=False, repr=False)
+	_buffer = attrib(factory=bytearray, init=False, repr=False)
+	_state = attrib(default=None, init=False, repr=False)
+	_next_state = attrib(default=None, init=False, repr=False)
+	_remaining = attrib(default=None, init=False, repr=False)
+	_position = attrib(default=0, init=False, repr=False)
+	_size = attrib(default=0, init=False, repr=False)
+	_final = attrib(default=False, init=False, repr=False)
+	_audio_start = attrib(default=0, init=False, repr=False)
+	_end_buffer = attrib(factory=bytearray, init=False, repr=False)
+	_ogg_packets = attrib(default=0, init=False, repr=False)
+
+	def __attrs_post_init__(self):
+		self._state = self._detect_format
+
+	def update(self, data):
+		"""Add audio data to the hash.
+
+		Parameters:
+			data (bytes-like object): The next chunk of audio data.
+		"""
+
+		if self._client_id is not None:
+			raise ValueError("Client ID has already been finalized.")
+
+		data = memoryview(data).cast('B')
+		self._size += len(data)
+
+		if self._state == self._hash_data and not self._buffer:
+			# Hash directly from the given data when nothing is buffered.
+			data = self._hash(data)
+		elif self._format != 'MP3':
+			self._buffer += data
+
+		while self._state():
+			pass
+
+		if self._format in [None, 'MP3']:
+			self._update_end_buffer(data)
+		elif self._end_buffer:
+			self._end_buffer = bytearray()
+
+	def finalize(self):
+		"""Finish hashing and return the client ID.
+
+		Returns:
+			str: The client ID of the audio data.
+
+		Raises:
+			ValueError: If the audio data is incomplete or invalid.
+		"""
+
+		if self._client_id is not None:
+			return self._client_id
+
+		self._final = True
+		while self._state():
+			pass
+
+		if self._format == 'MP3':
+			audio_end = self._size - _find_end_tag_offset(self._end_buffer)
+			buffer_start = self._size - len(self._end_buffer)
+			audio_start = max(self._audio_start, buffer_start)
+
+			if audio_end > audio_start:
+				self._md5.update(self._end_buffer[audio_start - buffer_start:audio_end - buffer_start])
+
+			self._md5sum = self._md5.digest()
+		elif self._format == 'FLAC':
+			if self._md5sum is None:
+				raise ValueError("Valid FLAC stream info not found.")
+		elif self._state in [self._hash_data, self._ignore_data]:
+			self._md5sum = self._md5.digest()
+		else:
+			raise ValueError(f"Audio data not found in {self._format} data.")
+
+		self._client_id = b64encode(self._md5sum).rstrip(b'=').decode('ascii')
+
+		return self._client_id
+
+	def _consume(self, size):
+		data = bytes(self._buffer[:size])
+		del self._buffer[:size]
+		self._position += len(data)
+
+		return data
+
+	def _hash(self, data):
+		if self._remaining is None:
+			size = len(data)
+		else:
+			size = min(self._remaining, len(data))
+			self._remaining -= size
+
+		self._md5.update(data[:size])
+		self._position += size
+
+		return data[size:]
+
+	def _update_end_buffer(self, data):
+		self._end_buffer += data
+
+		excess = len(self._end_buffer) - _END_TAG_SEARCH_SIZE
+		if excess > 0:
+			if self._format == 'MP3':
+				# Bytes leaving the end buffer can't be part of an end tag.
+				buffer_start = self._size - len(self._end_buffer)
+				start = max(self._audio_start - buffer_start, 0)
+				if start < excess:
+					self._md5.update(self._end_buffer[start:excess])
+
+			del self._end_buffer[:excess]
+
+	def _detect_format(self):
+		buffer = self._buffer
+
+		if len(buffer) < 36 and not self._final:
+			return False
+
+		if (
+			self._position == 0
+			and buffer.startswith(b'ID3')
+			and len(buffer) >= 10
+		):
+			# The ID3v2 tag size is a synchsafe integer excluding the header and footer.
+			size = 0
+			for byte in buffer[6:10]:
+				size = (size << 7) | (byte & 0x7F)
+
+			size += 10
+			if buffer[3] == 4 and buffer[5] & 0x10:
+				size += 10
+
+			self._audio_start = size
+			self._remaining = size
+			self._state = self._skip_data
+			self._next_state = self._detect_format
+		elif buffer.startswith(b'fLaC'):
+			self._format = 'FLAC'
+			self._state = self._read_flac_streaminfo
+		elif self._position == 0 and buffer.startswith(b'RIFF') and buffer[8:12] == b'WAVE':
+			self._format = 'WAVE'
+			self._consume(12)
+			self._state = self._read_wave_chunk
+		elif self._position == 0 and buffer.startswith(b'OggS') and b'OpusHead' in buffer[:36]:
+			self._format = 'OggOpus'
+			self._state = self._read_ogg_page
+		elif self._position == 0 and buffer.startswith(b'OggS') and b'\x01vorbis' in buffer[:36]:
+			self._format = 'OggVorbis'
+			self._state = self._read_ogg_page
+		elif self._position == 0 and buffer[4:8] == b'ftyp':
+			self._format = 'MP4'
+			self._state = self._read_mp4_atom
+		else:
+			# MP3 audio is hashed from the end buffer.
+			self._format = 'MP3'
+			self._audio_start = self._position
+			self._position += len(buffer)
+			self._buffer = bytearray()
+			self._state = self._ignore_data
+
+			return False
+
+		return True
+
+	def _skip_data(self):
+		size = min(self._remaining, len(self._buffer))
+		self._consume(size)
+		self._remaining -= size
+
+		if self._remaining:
+			return False
+
+		self._state = self._next_state
+
+		return True
+
+	def _hash_data(self):
+		if self._buffer:
+			self._buffer = bytearray(self._hash(self._buffer))
+
+		if self._remaining == 0:
+			self._state = self._ignore_data
+			return True
+
+		return False
+
+	def _ignore_data(self):
+		self._position += len(self._buffer)
+		self._buffer = bytearray()
+
+		return False
+
+	def _read_flac_streaminfo(self):
+		# 'fLaC' + metadata block header + STREAMINFO block.
+		# The MD5 signature is the last 16 bytes of STREAMINFO.
+		if len(self._buffer) < 42:
+			return False
+
+		self._md5sum = bytes(self._buffer[26:42])
+		self._state = self._ignore_data
+
+		return True
+
+	def _read_wave_chunk(self):
+		if len(self._buffer) < 8:
+			return False
+
+		chunk_id, chunk_size = struct.unpack('<4sI', self._consume(8))
+
+		if chunk_id == b'data':
+			self._state = self._hash_data
+		else:
+			self._state = self._skip_data
+			self._next_state = self._read_wave_chunk
+
+		self._remaining = chunk_size
+
+		return True
+
+	def _read_ogg_page(self):
+		buffer = self._buffer
+
+		if len(buffer) < 27 or len(buffer) < 27 + buffer[26]:
+			return False
+
+		if not buffer.startswith(b'OggS'):
+			raise ValueError("Valid Ogg page header not found.")
+
+		position = struct.unpack('<q', buffer[6:14])[0]
+		lacing_values = self._consume(27 + buffer[26])[27:]
+
+		if self._format == 'OggVorbis':
+			# Hashing starts after the first page with a granule position (the 1st audio page).
+			is_audio_start = position != 0
+		else:
+			# Hashing starts after the OpusHead and OpusTags packets.
+			self._ogg_packets += sum(lacing_value < 255 for lacing_value in lacing_values)
+			is_audio_start = self._ogg_packets >= 2
+
+		self._remaining = sum(lacing_values)
+		self._state = self._skip_data
+		self._next_state = self._start_ogg_audio if is_audio_start else self._read_ogg_page
+
+		return True
+
+	def _start_ogg_audio(self):
+		self._remaining = None
+		self._state = self._hash_data
+
+		return True
+
+	def _read_mp4_atom(self):
+		if len(self._buffer) < 8:
+			return False
+
+		atom_size, atom_type = struct.unpack('>I4s', self._buffer[:8])
+
+		if atom_size == 1:
+			if len(self._buffer) < 16:
+				return False
+
+			atom_size = struct.unpack('>Q', self._consume(16)[8:])[0] - 16
+		else:
+			self._consume(8)
+			atom_size = None if atom_size == 0 else atom_size - 8
+
+		self._remaining = atom_size
+
+		if atom_type == b'mdat':
+			self._state = self._hash_data
+		elif atom_size is None:
+			self._state = self._ignore_data
+		else:
+			self._state = self._skip_data
+			self._next_state = self._read_mp4_atom
+
+		return True
+
+
+def _find_ogg_audio_start(filepath, offset):
+	# Scan a large buffer for Ogg page capture patterns
+	# rather than parsing each page from the file.
+	# Returns the end of the first page with a granule position.
+	read_size = 256 * 1024
+
+	with open(filepath, 'rb') as f:
+		f.seek(offset, os.SEEK_SET)
+		buffer = f.read(read_size)
+		index = 0
+
+		while True:
+			index = buffer.find(b'OggS', index)
+
+			if index != -1 and index + 27 <= len(buffer):
+				header_end = index + 27 + buffer[index + 26]
+
+				if header_end <= len(buffer):
+					position = struct.unpack_from('<q', buffer, index + 6)[0]
+					page_end = header_end + sum(buffer[index + 27:header_end])
+
+					if position:
+						return offset + page_end
+
+					index = page_end
+					if index < len(buffer):
+						continue
+			elif index == -1:
+				# Keep a partial capture pattern at the end of the buffer.
+				index = max(len(buffer) - 3, 0)
+
+			buffer_end = offset + len(buffer)
+
+			offset += index
+			f.seek(offset, os.SEEK_SET)
+			buffer = f.read(read_size)
+			index = 0
+
+			if offset + len(buffer) <= buffer_end:
+				raise ValueError("Valid Ogg audio page not found.")
+
+
+def _hash_audio(filepath, audio_start, audio_size, *, use_mmap=True):
+	m = md5()
+
+	with open(filepath, 'rb') as f:
+		if use_mmap:
+			try:
+				mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			except (OSError, ValueError):
+				# Empty files, pipes, and some filesystems can't be memory-mapped.
+				pass
+			else:
+				with mm:
+					if hasattr(mm, 'madvise'):
+						mm.madvise(mmap.MADV_SEQUENTIAL)
+
+					# Hash directly from the page cache without intermediate copies.
+					with memoryview(mm) as view:
+						with view[audio_start:audio_start + audio_size] as audio:
+							m.update(audio)
+
+				return m.digest()
+
+		# Speed up by reading in chunks to a reused buffer.
+		f.seek(audio_start, os.SEEK_SET)
+		buffer = memoryview(bytearray(65536))
+		remaining = audio_size
+		while remaining > 0:
+			read = f.readinto(buffer[:min(remaining, 65536)])
+			if not read:
+				break
+
+			m.update(buffer[:read])
+			remaining -= read
+
+	return m.digest()
 
 
 # The id is found by getting md5sum of audio, base64 encode md5sum, removing trailing '=', except for FLAC.
@@ -23,152 +575,923 @@ from tbm_utils import DataReader
 # MP4: Audio is the entire 'mdat' atom.
 # Ogg Vorbis: For some reason, Google seems to use the start of the 2nd audio page for client ID generation.
 # Ogg Vorbis: This could actually just be an off-by-one error in their code.
-def generate_client_id(song):
-	def _hash_data(m, f, audio_size):
-		# Speed up by reading in chunks
-		read = 0
-		read_size = min(audio_size - read, 65536)
-		while read_size > 0:
-			data = f.read(read_size)
-			m.update(data)
+def generate_client_id(song, *, use_mmap=True, cache=None):
+	"""Generate a client ID for an audio file.
+
+	Parameters:
+		song (os.PathLike or str or audio_metadata.Format):
+			The path to an audio file or an instance of :class:`audio_metadata.Format`.
+		use_mmap (bool, Optional):
+			Hash audio data from a memory-mapped view of the file.
+			Falls back to buffered reads for files that can't be memory-mapped.
+			Default: ``True``
+		cache (ClientIDCache, Optional):
+			A client ID cache to consult before hashing and update after.
+
+	Returns:
+		str: The client ID of the audio file.
+	"""
+
+	if isinstance(song, PreparedSong):
+		song = song.metadata
+
+	if cache is not None:
+		filepath = song.filepath if isinstance(song, audio_metadata.Format) else song
+
+		if filepath is not None:
+			client_id = cache.get(filepath)
+			if client_id is not None:
+				return client_id
+
+			client_id = generate_client_id(song, use_mmap=use_mmap)
+			cache.put(filepath, client_id)
+
+			return client_id
+
+	if not isinstance(song, audio_metadata.Format):  # pragma: nobranch
+		song = audio_metadata.load(song)
+
+	md5sum = None
+	if isinstance(song, audio_metadata.FLAC):
+		md5sum = unhexlify(song.streaminfo.md5)
+	else:
+		if isinstance(song, audio_metadata.MP3):
+			if '_id3' in song and isinstance(song._id3, audio_metadata.ID3v2):
+				audio_start = song._id3._size
+			else:
+				audio_start = 0
+
+			audio_size = song.streaminfo._end - audio_start
+		elif isinstance(song, audio_metadata.OggVorbis):
+			audio_start = _find_ogg_audio_start(song.filepath, song.streaminfo._start)
+			audio_size = song.streaminfo._size
+		else:
+			audio_start = song.streaminfo._start
+			audio_size = song.streaminfo._size
+
+		md5sum = _hash_audio(song.filepath, audio_start, audio_size, use_mmap=use_mmap)
+
+	client_id = b64encode(md5sum).rstrip(b'=').decode('ascii')
+
+	return client_id
+
+
+def _map_chunk(func, items):
+	results = []
+	for item in items:
+		try:
+			result = func(item)
+		except Exception as e:
+			result = e
+
+		results.append((item, result))
+
+	return results
+
+
+def _imap_unordered(func, items, *, workers=None, chunksize=8, max_pending=None, lookup=None):
+	# Yield (item, result) pairs from a process pool in completion order.
+	# Exceptions are given in place of results rather than raised.
+	# If lookup returns a result for an item, e.g. from a cache,
+	# it's yielded as soon as the item is read instead of being sent to the pool.
+	if chunksize < 1:
+		raise ValueError("'chunksize' must be greater than 0.")
+
+	if workers is None:
+		workers = os.cpu_count() or 1
+
+	# Keep a bounded number of items in flight
+	# so large or lazy inputs aren't consumed all at once.
+	if max_pending is None:
+		max_pending = workers * chunksize * 2
+
+	max_chunks = max(max_pending // chunksize, 1)
+
+	items = iter(items)
+
+	# The pool is only started once there's an item to send to it.
+	executor = None
+	try:
+		pending = {}
+		while True:
+			while len(pending) < max_chunks:
+				chunk = []
+				for item in items:
+					if lookup is not None:
+						result = lookup(item)
+						if result is not None:
+							yield item, result
+							continue
+
+					chunk.append(item)
+					if len(chunk) == chunksize:
+						break
+
+				if not chunk:
+					break
+
+				if executor is None:
+					executor = ProcessPoolExecutor(max_workers=workers)
+
+				pending[executor.submit(_map_chunk, func, chunk)] = chunk
+
+			if not pending:
+				break
+
+			done, _ = wait(pending, return_when=FIRST_COMPLETED)
+			for future in done:
+				chunk = pending.pop(future)
+
+				try:
+					results = future.result()
+				except Exception as e:
+					# The whole chunk failed (e.g. a broken pool or unpicklable result).
+					results = [(item, e) for item in chunk]
+
+				yield from results
+	finally:
+		if executor is not None:
+			executor.shutdown()
+
+
+def generate_client_ids(songs, *, workers=None, chunksize=8, cache=None):
+	"""Generate client IDs for many audio files using a pool of processes.
+
+	Results are yielded in the order they complete, not the order given.
+	If a client ID can't be generated for an audio file,
+	the exception raised is yielded in place of the client ID
+	rather than aborting the rest of the batch.
+
+	Parameters:
+		songs (iterable):
+			Paths to audio files as :class:`os.PathLike` or filepath strings.
+		workers (int, Optional):
+			The number of worker processes to use.
+			Default: The number of CPUs on the machine.
+		chunksize (int, Optional):
+			The number of audio files sent to a worker process at a time.
+			Default: ``8``
+		cache (ClientIDCache, Optional):
+			A client ID cache to consult before hashing and update after.
+			Cached client IDs are yielded as soon as they're found
+			without being sent to a worker process.
+			No worker processes are started if every client ID is cached.
+
+	Yields:
+		tuple: A ``(song, client_id)`` pair for each audio file.
+	"""
+
+	if cache is None:
+		yield from _imap_unordered(generate_client_id, songs, workers=workers, chunksize=chunksize)
+		return
+
+	def _lookup(song):
+		# Wrapped to tell cached client IDs from generated ones.
+		client_id = cache.get(song)
+		return (client_id,) if client_id is not None else None
+
+	results = _imap_unordered(
+		generate_client_id,
+		songs,
+		workers=workers,
+		chunksize=chunksize,
+		lookup=_lookup,
+	)
+	for song, client_id in results:
+		if isinstance(client_id, tuple):
+			client_id = client_id[0]
+		elif not isinstance(client_id, Exception):
+			cache.put(song, client_id)
+
+		yield song, client_id
+
+
+# Google's Music manager uses this album art selection algorithm:
+# * If picture(s) of type 'front cover' are found, use the first one of those in the list.
+# * If picture(s) of type 'other' are found, use the first one of those in the list.
+# * If picture(s) of type 'back cover' are found, use the first one of those in the list.
+_ALBUM_ART_PRIORITIES = {
+	3: 0,
+	0: 1,
+	4: 2,
+}
+
+
+def _select_picture(pictures):
+	# Single pass over (picture_type, picture) pairs.
+	selected = None
+	selected_priority = len(_ALBUM_ART_PRIORITIES)
+	for picture_type, picture in pictures:
+		priority = _ALBUM_ART_PRIORITIES.get(picture_type, selected_priority)
+
+		if priority < selected_priority:
+			selected = picture
+			selected_priority = priority
+
+			if priority == 0:
+				break
+
+	return selected
+
+
+class _UnsupportedPictures(Exception):
+	"""Raised when pictures can't be located without fully parsing a file."""
+
+
+def _read_exactly(f, size):
+	data = f.read(size)
+	if len(data) != size:
+		raise _UnsupportedPictures
+
+	return data
+
+
+def _decode_synchsafe(data):
+	value = 0
+	for byte in data:
+		value = (value << 7) | (byte & 0x7F)
+
+	return value
+
+
+def _remove_unsynchronization(data):
+	return data.replace(b'\xFF\x00', b'\xFF')
+
+
+def _parse_id3v2_picture_header(frame_data, major):
+	# Returns the picture type and start of the image data in an APIC/PIC frame.
+	if len(frame_data) < 2:
+		raise _UnsupportedPictures
+
+	encoding = frame_data[0]
+
+	if major == 2:
+		# A 3-byte image format instead of a null-terminated MIME type.
+		mime_end = 3
+	else:
+		mime_end = frame_data.find(b'\x00', 1)
+		if mime_end == -1:
+			raise _UnsupportedPictures
+
+	if mime_end + 1 >= len(frame_data):
+		raise _UnsupportedPictures
+
+	picture_type = frame_data[mime_end + 1]
+
+	description_start = mime_end + 2
+	if encoding in (1, 2):
+		# UTF-16 descriptions end with an aligned double null.
+		description_end = description_start
+		while True:
+			description_end = frame_data.find(b'\x00\x00', description_end)
+			if description_end == -1:
+				raise _UnsupportedPictures
+
+			if (description_end - description_start) % 2 == 0:
+				break
+
+			description_end += 1
+
+		return picture_type, description_end + 2
+
+	description_end = frame_data.find(b'\x00', description_start)
+	if description_end == -1:
+		raise _UnsupportedPictures
+
+	return picture_type, description_end + 1
+
+
+_IMAGE_HEAD_SIZE = 56
+
+
+def _is_image(data):
+	# The image formats audio-metadata accepts in ID3v2 picture frames.
+	# Other frames, e.g. with a '-->' link instead of image data, are ignored by it.
+	return (
+		(data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10)
+		or (data[:4] == b'\x89PNG' and data[12:16] == b'IHDR' and len(data) >= 24)
+		or data[:2] == b'\xFF\xD8'
+		or (data[:6] == b'\x00\x00\x00\x0cjP' and len(data) >= 56)
+		or (data[:2] == b'BM' and len(data) >= 26)
+	)
+
+
+def _decode_id3v2_picture(frame_data, major):
+	frame_data = _remove_unsynchronization(frame_data)
+
+	return frame_data[_parse_id3v2_picture_header(frame_data, major)[1]:]
+
+
+def _index_id3v2_pictures(f, offset):
+	f.seek(offset)
+	header = _read_exactly(f, 10)
+	if header[:3] != b'ID3':
+		raise _UnsupportedPictures
+
+	major, flags = header[3], header[5]
+	tag_end = offset + 10 + _decode_synchsafe(header[6:10])
+
+	if major not in (2, 3, 4):
+		raise _UnsupportedPictures
+
+	# In ID3v2.2 and ID3v2.3, unsynchronization applies to the frame headers too.
+	tag_unsync = bool(flags & 0x80)
+	if tag_unsync and major < 4:
+		raise _UnsupportedPictures
+
+	position = offset + 10
+	if major > 2 and flags & 0x40:
+		ext_header = _read_exactly(f, 4)
+		if major == 3:
+			position += 4 + struct.unpack('>I', ext_header)[0]
+		else:
+			position += _decode_synchsafe(ext_header)
+
+	if major == 2:
+		header_size, picture_id = 6, b'PIC'
+	else:
+		header_size, picture_id = 10, b'APIC'
+
+	pictures = []
+	while position + header_size <= tag_end:
+		f.seek(position)
+		frame_header = _read_exactly(f, header_size)
+
+		if major == 2:
+			frame_id = frame_header[:3]
+			frame_size = int.from_bytes(frame_header[3:6], 'big')
+		elif major == 3:
+			frame_id = frame_header[:4]
+			frame_size = struct.unpack('>I', frame_header[4:8])[0]
+		else:
+			frame_id = frame_header[:4]
+			frame_size = _decode_synchsafe(frame_header[4:8])
+
+		# Padding or the end of the frames.
+		if frame_size == 0 or not frame_id.strip(b'\x00'):
+			break
+
+		frame_start = position + header_size
+		position = frame_start + frame_size
+
+		if frame_id != picture_id:
+			continue
+
+		unsync = tag_unsync
+		if major == 3:
+			# Compressed, encrypted, or grouped frames.
+			if frame_header[9]:
+				raise _UnsupportedPictures
+		elif major == 4:
+			frame_flags = frame_header[9]
+
+			# Compressed, encrypted, or grouped frames.
+			if frame_flags & 0x4C:
+				raise _UnsupportedPictures
+
+			# Skip the data length indicator.
+			if frame_flags & 0x01:
+				frame_start += 4
+				frame_size -= 4
+
+			unsync = unsync or bool(frame_flags & 0x02)
+
+		f.seek(frame_start)
+		frame_data = _read_exactly(f, min(frame_size, 4096))
+		header_data = _remove_unsynchronization(frame_data) if unsync else frame_data
+
+		picture_type, data_start = _parse_id3v2_picture_header(header_data, major)
+
+		# Enough of the image data to recognize its format.
+		image_head = header_data[data_start:data_start + _IMAGE_HEAD_SIZE]
+		if len(image_head) < _IMAGE_HEAD_SIZE and len(frame_data) < frame_size:
+			raise _UnsupportedPictures
+
+		if not _is_image(image_head):
+			continue
+
+		if unsync:
+			pictures.append(
+				(picture_type, (frame_start, frame_size, _decode_id3v2_picture, major))
+			)
+		else:
+			pictures.append(
+				(picture_type, (frame_start + data_start, frame_size - data_start, None, None))
+			)
+
+	return pictures
+
+
+def _index_flac_pictures(f, offset):
+	f.seek(offset)
+	if _read_exactly(f, 4) != b'fLaC':
+		raise _UnsupportedPictures
+
+	pictures = []
+	position = offset + 4
+	is_last = False
+	while not is_last:
+		f.seek(position)
+		block_header = struct.unpack('>I', _read_exactly(f, 4))[0]
+		is_last = bool(block_header >> 31)
+		block_type = (block_header >> 24) & 0x7F
+		block_size = block_header & 0xFFFFFF
+
+		if block_type == 6:
+			picture_type, mime_size = struct.unpack('>II', _read_exactly(f, 8))
+			f.seek(mime_size, os.SEEK_CUR)
+			description_size = struct.unpack('>I', _read_exactly(f, 4))[0]
+			f.seek(description_size + 16, os.SEEK_CUR)
+			data_size = struct.unpack('>I', _read_exactly(f, 4))[0]
+
+			pictures.append((picture_type, (f.tell(), data_size, None, None)))
+
+		position += 4 + block_size
+
+	return pictures
+
+
+def _index_wave_pictures(f):
+	f.seek(12)
+	id3_offset = None
+	while True:
+		subchunk_header = f.read(8)
+		if len(subchunk_header) < 8:
+			break
+
+		subchunk_id, subchunk_size = struct.unpack('<4sI', subchunk_header)
+		if subchunk_id.lower() == b'id3 ':
+			id3_offset = f.tell()
+
+		f.seek(subchunk_size, os.SEEK_CUR)
+
+	if id3_offset is None:
+		return []
+
+	return _index_id3v2_pictures(f, id3_offset)
+
+
+def _index_pictures(f):
+	"""Index the type and location of embedded pictures without reading their data.
+
+	Returns:
+		list: ``(picture_type, (offset, size, decode, major))`` pairs
+		in the order audio-metadata lists pictures.
+		If ``decode`` is given, it's called with the raw data and ID3v2 major version
+		to get the image data.
+
+	Raises:
+		_UnsupportedPictures: If pictures can't be located this way.
+	"""
+
+	header = f.read(12)
+
+	if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+		return _index_wave_pictures(f)
+
+	offset = 0
+	if header[:3] == b'ID3':
+		offset = 10 + _decode_synchsafe(header[6:10])
+		if header[5] & 0x10:
+			offset += 10
+
+		f.seek(offset)
+
+		# ID3v2 is ignored in FLAC.
+		if f.read(4) != b'fLaC':
+			return _index_id3v2_pictures(f, 0)
+	elif header[:2] in (b'\xFF\xFA', b'\xFF\xFB', b'\xFF\xF2', b'\xFF\xF3', b'\xFF\xE3'):
+		# MP3 without ID3v2.
+		return []
+	elif header[:4] != b'fLaC':
+		# Pictures in other formats, e.g. Vorbis comments, are encoded in the tags.
+		raise _UnsupportedPictures
+
+	return _index_flac_pictures(f, offset)
+
+
+def get_album_art(song):
+	"""Get the album art of an audio file.
+
+	For paths to FLAC, MP3, and WAVE files, the type and location of embedded pictures
+	are indexed first and only the data of the selected picture is read.
+
+	Parameters:
+		song (os.PathLike or str or file or audio_metadata.Format or PreparedSong):
+			The path to an audio file, a file-like object of an audio file,
+			an instance of :class:`audio_metadata.Format`,
+			or an instance of :class:`PreparedSong`.
+
+	Returns:
+		bytes: The binary data of the selected album art image, or ``None``.
+	"""
+
+	if isinstance(song, (str, os.PathLike)):
+		try:
+			with open(song, 'rb') as f:
+				location = _select_picture(_index_pictures(f))
+
+				if location is None:
+					return None
+
+				offset, size, decode, major = location
+				f.seek(offset)
+				data = _read_exactly(f, size)
+
+				return decode(data, major) if decode is not None else data
+		except (_UnsupportedPictures, struct.error):
+			pass
+
+	song = _load_metadata(song)
+
+	return _select_picture(
+		(picture.type, picture.data)
+		for picture in song.pictures
+	)
+
+
+_CODEC_RE = re.compile(r'^\s*([D.])([E.])([VAS.])\S*\s+(\S+)\s+(.*)$')
+_CODEC_IMPLEMENTATIONS_RE = re.compile(r'\((decoders|encoders): ([^)]*)\)')
+_FORMAT_RE = re.compile(r'^\s*([D ])([E ])\S*\s+(\S+)\s')
+
+
+def _listing_lines(output):
+	# Skip the legend before the line of dashes.
+	lines = output.splitlines()
+	for i, line in enumerate(lines):
+		if line.strip().startswith('--'):
+			return lines[i + 1:]
+
+	return lines
+
+
+def _parse_codecs(output):
+	decoders = set()
+	encoders = set()
+
+	for line in _listing_lines(output):
+		match = _CODEC_RE.match(line)
+		if match is None:
+			continue
+
+		can_decode, can_encode, _, codec, description = match.groups()
+		implementations = {
+			kind: names.split()
+			for kind, names in _CODEC_IMPLEMENTATIONS_RE.findall(description)
+		}
+
+		if can_decode == 'D':
+			decoders.update(implementations.get('decoders', [codec]))
+		if can_encode == 'E':
+			encoders.update(implementations.get('encoders', [codec]))
+
+	return frozenset(decoders), frozenset(encoders)
+
+
+def _parse_formats(output):
+	input_formats = set()
+
+	for line in _listing_lines(output):
+		match = _FORMAT_RE.match(line)
+		if match is not None and match.group(1) == 'D':
+			input_formats.update(match.group(3).split(','))
+
+	return frozenset(input_formats)
+
+
+@attrs(slots=True, frozen=True)
+class Transcoder:
+	"""The capabilities of a transcoder (ffmpeg or avconv).
+
+	Attributes:
+		path (str): The path to the transcoder.
+		version (str): The version line printed by the transcoder.
+		decoders (frozenset): The names of available decoders.
+		encoders (frozenset): The names of available encoders.
+		input_formats (frozenset): The names of available demuxers.
+	"""
+
+	path = attrib()
+	version = attrib(default=None)
+	decoders = attrib(default=frozenset())
+	encoders = attrib(default=frozenset())
+	input_formats = attrib(default=frozenset())
+
+	@property
+	def mp3_encoding_support(self):
+		"""Whether the transcoder can encode MP3 with libmp3lame."""
+
+		return 'libmp3lame' in self.encoders
+
+	@classmethod
+	def probe(cls, command_path):
+		"""Probe the capabilities of a transcoder.
+
+		Parameters:
+			command_path (str): The path to the transcoder.
+		"""
+
+		codecs = subprocess.run(
+			[command_path, '-codecs'],
+			stdout=subprocess.PIPE,
+			stderr=subprocess.PIPE,
+			universal_newlines=True,
+		)
+		formats = subprocess.run(
+			[command_path, '-hide_banner', '-formats'],
+			stdout=subprocess.PIPE,
+			stderr=subprocess.DEVNULL,
+			universal_newlines=True,
+		)
+
+		# The banner is written to stderr.
+		version = next(
+			(
+				line.strip()
+				for line in codecs.stderr.splitlines()
+				if 'version' in line
+			),
+			None
+		)
+		decoders, encoders = _parse_codecs(codecs.stdout)
+
+		return cls(
+			path=command_path,
+			version=version,
+			decoders=decoders,
+			encoders=encoders,
+			input_formats=_parse_formats(formats.stdout),
+		)
+
+
+@attrs(slots=True)
+class TranscoderRegistry:
+	"""A registry of transcoders that probes each transcoder once.
+
+	The path of each transcoder and its capabilities are cached
+	until :meth:`refresh` is called, e.g. after installing or upgrading ffmpeg.
+
+	The default registry, :data:`transcoders`, is used by :func:`get_transcoder`
+	and :func:`transcode_to_mp3`.
+
+	Parameters:
+		names (list, Optional):
+			The names of transcoders to look for in order of preference.
+			Default: ``['ffmpeg', 'avconv']``
+	"""
+
+	names = attrib(factory=lambda: ['ffmpeg', 'avconv'])
+
+	_lock = attrib(factory=threading.RLock, init=False, repr=False)
+	_resolved = attrib(factory=dict, init=False, repr=False)
+	_transcoders = attrib(factory=dict, init=False, repr=False)
+
+	def probe(self, command_path):
+		"""Get the capabilities of a transcoder, probing it if not already probed.
+
+		Parameters:
+			command_path (str): The path to the transcoder.
+
+		Returns:
+			Transcoder: The capabilities of the transcoder.
+		"""
+
+		with self._lock:
+			transcoder = self._transcoders.get(command_path)
+			if transcoder is None:
+				transcoder = self._transcoders[command_path] = Transcoder.probe(command_path)
+
+		return transcoder
+
+	def get(self, *, path=None):
+		"""Get the first transcoder with MP3 support.
+
+		Parameters:
+			path (str, Optional):
+				The search path for transcoders as used by :func:`shutil.which`.
+				Default: The ``PATH`` environment variable.
+
+		Returns:
+			Transcoder: The capabilities of the transcoder.
+
+		Raises:
+			ValueError: If no transcoder with MP3 support is found.
+		"""
+
+		with self._lock:
+			transcoder = self._resolved.get(path)
+			if transcoder is not None:
+				return transcoder
+
+			transcoder_details = {}
+			for name in self.names:
+				command_path = shutil.which(name, path=path)
+				if command_path is None:
+					transcoder_details[name] = 'Not installed.'
+					continue
+
+				transcoder = self.probe(command_path)
 
-			read += read_size
-			read_size = min(audio_size - read, 65536)
+				if transcoder.mp3_encoding_support:
+					self._resolved[path] = transcoder
+					return transcoder
+				else:
+					transcoder_details[name] = "No MP3 encoding support."
 
-		return m.digest()
+		raise ValueError(
+			f"ffmpeg or avconv must be in the path and support mp3 encoding."
+			f"\nDetails: {transcoder_details}"
+		)
 
-	if not isinstance(song, audio_metadata.Format):  # pragma: nobranch
-		song = audio_metadata.load(song)
+	def refresh(self, command_path=None):
+		"""Forget probed transcoders so they're found and probed again on next use.
 
-	md5sum = None
-	if isinstance(song, audio_metadata.FLAC):
-		md5sum = unhexlify(song.streaminfo.md5)
-	else:
-		m = md5()
-		if isinstance(song, audio_metadata.MP3):
-			if '_id3' in song and isinstance(song._id3, audio_metadata.ID3v2):
-				audio_start = song._id3._size
+		Parameters:
+			command_path (str, Optional):
+				The path to a transcoder to forget.
+				Default: Forget all transcoders.
+		"""
+
+		with self._lock:
+			if command_path is None:
+				self._transcoders.clear()
+				self._resolved.clear()
 			else:
-				audio_start = 0
+				self._transcoders.pop(command_path, None)
 
-			audio_size = song.streaminfo._end - audio_start
-			with open(song.filepath, 'rb') as f:
-				f.seek(audio_start, os.SEEK_SET)
-				md5sum = _hash_data(m, f, audio_size)
-		elif isinstance(song, audio_metadata.OggVorbis):
-			f = DataReader(song.filepath)
-			f.seek(song.streaminfo._start)
+				for search_path, transcoder in list(self._resolved.items()):
+					if transcoder.path == command_path:
+						del self._resolved[search_path]
 
-			while True:
-				page = audio_metadata.OggPage.parse(f)
-				if page.position:
-					break
 
-			audio_start = f.tell()
-			audio_size = song.streaminfo._size
-			md5sum = _hash_data(m, f, audio_size)
-		else:
-			audio_size = song.streaminfo._size
-			with open(song.filepath, 'rb') as f:
-				f.seek(song.streaminfo._start)
-				md5sum = _hash_data(m, f, audio_size)
+transcoders = TranscoderRegistry()
+"""The default :class:`TranscoderRegistry`."""
 
-	client_id = b64encode(md5sum).rstrip(b'=').decode('ascii')
 
-	return client_id
+def get_transcoder(*, path=None):
+	"""Return the path to a transcoder (ffmpeg or avconv) with MP3 support.
 
+	Transcoders are found and probed once using :data:`transcoders`.
+	Call ``transcoders.refresh()`` to find them again.
+	"""
 
-def get_album_art(song):
-	if not isinstance(song, audio_metadata.Format):  # pragma: nobranch
-		song = audio_metadata.load(song)
+	return transcoders.get(path=path).path
 
-	# Google's Music manager uses this album art selection algorithm:
-	# * If picture(s) of type 'front cover' are found, use the first one of those in the list.
-	# * If picture(s) of type 'other' are found, use the first one of those in the list.
-	# * If picture(s) of type 'back cover' are found, use the first one of those in the list.
-	for picture_type in [3, 0, 4]:
-		album_art = next(
-			(
-				picture.data
-				for picture in song.pictures
-				if picture.type == picture_type
-			),
-			None
-		)
 
-		if album_art is not None:
-			break
+def _transcode_error_message(command, e, stderr):
+	error_msg = f"Transcode command '{' '.join(command)}' failed: {e}. "
 
-	return album_art
+	if 'No such file or directory' in str(e):
+		error_msg += '\nffmpeg or avconv must be installed PATH.'
 
+	if stderr is not None:
+		error_msg += f"\nstderr: '{stderr}'"
 
-def get_transcoder(*, path=None):
-	"""Return the path to a transcoder (ffmpeg or avconv) with MP3 support."""
+	return error_msg
 
-	transcoders = ['ffmpeg', 'avconv']
-	transcoder_details = {}
 
-	for transcoder in transcoders:
-		command_path = shutil.which(transcoder, path=path)
-		if command_path is None:
-			transcoder_details[transcoder] = 'Not installed.'
-			continue
+@attrs(slots=True, frozen=True)
+class TranscodeTiming:
+	"""The timing of a transcoder process run by :func:`transcode_to_mp3`.
 
-		stdout = subprocess.run(
-			[command_path, '-codecs'],
-			stdout=subprocess.PIPE,
-			stderr=subprocess.DEVNULL,
-			universal_newlines=True,
-		).stdout
+	Attributes:
+		command (list): The transcoder command.
+		wall_time (float): The seconds from starting the process to reaping it.
+		returncode (int): The exit status of the process,
+			or ``None`` if it couldn't be started.
+		timed_out (bool): Whether the process was killed for exceeding its timeout.
+		output_size (int): The number of bytes of output,
+			or ``None`` if the process failed.
+	"""
 
-		mp3_encoding_support = (
-			'libmp3lame' in stdout
-			and 'disable-libmp3lame' not in stdout
-		)
+	command = attrib()
+	wall_time = attrib()
+	returncode = attrib(default=None)
+	timed_out = attrib(default=False)
+	output_size = attrib(default=None)
 
-		if mp3_encoding_support:
-			break
-		else:
-			transcoder_details[transcoder] = "No MP3 encoding support."
-	else:
-		raise ValueError(
-			f"ffmpeg or avconv must be in the path and support mp3 encoding."
-			f"\nDetails: {transcoder_details}"
-		)
 
-	return command_path
+def _limit_resources(pid, cpu_time_limit, memory_limit):
+	# Set the soft resource limits of a running child process.
+	# prlimit is used instead of a preexec_fn, which isn't safe to run while other threads,
+	# e.g. those of TranscodeScheduler or TranscodeStream, may hold locks.
+	if not hasattr(resource, 'prlimit'):
+		return
+
+	limits = []
+	if cpu_time_limit is not None:
+		limits.append((resource.RLIMIT_CPU, math.ceil(cpu_time_limit)))
+	if memory_limit is not None:
+		limits.append((resource.RLIMIT_AS, memory_limit))
+
+	try:
+		for limit, soft in limits:
+			_, hard = resource.prlimit(pid, limit)
+			if hard != resource.RLIM_INFINITY:
+				soft = min(soft, hard)
+
+			resource.prlimit(pid, limit, (soft, hard))
+	except ProcessLookupError:
+		# The process already exited.
+		pass
+
+
+def _transcode(
+	command,
+	input_=None,
+	*,
+	spool_size=None,
+	timeout=None,
+	cpu_time_limit=None,
+	memory_limit=None,
+	timings=None,
+):
+	if spool_size is None:
+		stdout = subprocess.PIPE
+	else:
+		# The transcoder writes straight to the file, so its output is never copied through Python.
+		stdout = tempfile.TemporaryFile()
 
+	process = None
+	timed_out = False
+	output_size = None
+	started = time.perf_counter()
 
-def _transcode(command, input_=None):
 	try:
-		transcode = subprocess.run(
+		with subprocess.Popen(
 			command,
-			input=input_,
-			stdout=subprocess.PIPE,
+			stdin=subprocess.PIPE if input_ is not None else None,
+			stdout=stdout,
 			stderr=subprocess.PIPE,
-		)
+		) as process:
+			try:
+				if cpu_time_limit is not None or memory_limit is not None:
+					_limit_resources(process.pid, cpu_time_limit, memory_limit)
+
+				output, stderr = process.communicate(input_, timeout=timeout)
+			except subprocess.TimeoutExpired:
+				timed_out = True
+				process.kill()
+				output, stderr = process.communicate()
 
-		transcode.check_returncode()
-	except (OSError, subprocess.CalledProcessError) as e:
-		error_msg = f"Transcode command '{' '.join(command)}' failed: {e}. "
+				raise subprocess.TimeoutExpired(command, timeout, output=output, stderr=stderr)
+			except BaseException:
+				# Leaving the with block reaps the killed process.
+				process.kill()
+				raise
 
-		if 'No such file or directory' in str(e):
-			error_msg += '\nffmpeg or avconv must be installed PATH.'
+		if process.returncode:
+			raise subprocess.CalledProcessError(process.returncode, command, output=output, stderr=stderr)
 
-		if transcode.stderr is not None:
-			error_msg += f"\nstderr: '{transcode.stderr}'"
+		if stdout is subprocess.PIPE:
+			output_size = len(output)
+		else:
+			output_size = os.fstat(stdout.fileno()).st_size
+	except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+		e.message = _transcode_error_message(command, e, getattr(e, 'stderr', None))
 
-		e.message = error_msg
+		if stdout is not subprocess.PIPE:
+			stdout.close()
 
 		raise
-	else:
-		return transcode.stdout
+	finally:
+		if timings is not None:
+			timings.append(
+				TranscodeTiming(
+					command,
+					time.perf_counter() - started,
+					returncode=process.returncode if process is not None else None,
+					timed_out=timed_out,
+					output_size=output_size,
+				)
+			)
+
+	if stdout is subprocess.PIPE:
+		return output
+
+	with stdout:
+		return _read_spool(stdout, spool_size)
+
+
+def _read_spool(f, spool_size):
+	if os.fstat(f.fileno()).st_size <= spool_size:
+		f.seek(0)
+		return f.read()
+
+	# The mapping stays valid after the file is closed.
+	return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
 
+def _build_transcode_command(song, *, slice_start=None, slice_duration=None, quality='320k', seek='output'):
+	if seek not in ('input', 'output'):
+		raise ValueError("'seek' must be 'input' or 'output'.")
 
-def transcode_to_mp3(song, *, slice_start=None, slice_duration=None, quality='320k'):
 	command_path = get_transcoder()
 	input_ = None
 
+	if isinstance(song, PreparedSong):
+		song = song.metadata
+
 	if isinstance(song, audio_metadata.Format):
 		if song.filepath is None:
 			raise ValueError("Audio metadata must be from a file.")
@@ -186,9 +1509,13 @@ def transcode_to_mp3(song, *, slice_start=None, slice_duration=None, quality='32
 			"'song' must be os.PathLike, filepath string, a file/bytes-like object, or binary data."
 		)
 
+	if slice_start is not None and seek == 'input':
+		# Seeking before the input skips to the nearest seek point instead of decoding up to it.
+		command[1:1] = ['-ss', str(slice_start)]
+
 	if slice_duration is not None:
 		command.extend(['-t', str(slice_duration)])
-	if slice_start is not None:
+	if slice_start is not None and seek == 'output':
 		command.extend(['-ss', str(slice_start)])
 
 	if isinstance(quality, int):
@@ -199,4 +1526,814 @@ def transcode_to_mp3(song, *, slice_start=None, slice_duration=None, quality='32
 	# Use 's16le' to not output id3 headers.
 	command.extend(['-f', 's16le', '-c', 'libmp3lame', '-'])
 
-	return _transcode(command, input_=input_)
+	return command, input_
+
+
+_MP3_VERSIONS = [2.5, None, 2, 1]
+
+# Frames before a slice that are re-encoded with it so the decoder has
+# the bit reservoir and overlap data of the first frames in the slice.
+_MP3_LEAD_FRAMES = 10
+
+_BITRATE_RE = re.compile(r'^(\d+)k$')
+
+
+def _parse_mp3_frame_header(data, offset):
+	# Return the (frame_size, samples_per_frame, sample_rate) of an MPEG audio frame header,
+	# or None if there isn't a valid frame header at offset.
+	if offset + 4 > len(data) or data[offset] != 0xFF:
+		return None
+
+	b1, b2 = data[offset + 1], data[offset + 2]
+	if b1 & 0xE0 != 0xE0:
+		return None
+
+	version = _MP3_VERSIONS[(b1 >> 3) & 0x03]
+	layer = 4 - ((b1 >> 1) & 0x03)
+	bitrate_index = b2 >> 4
+	sample_rate_index = (b2 >> 2) & 0x03
+
+	if (
+		version is None
+		or layer == 4
+		or bitrate_index in (0, 15)
+		or sample_rate_index == 3
+	):
+		return None
+
+	bitrate = audio_metadata.MP3Bitrates[(version, layer)][bitrate_index] * 1000
+	sample_rate = audio_metadata.MP3SampleRates[version][sample_rate_index]
+	samples_per_frame, slot_size = audio_metadata.MP3SamplesPerFrame[(version, layer)]
+	padded = (b2 >> 1) & 0x01
+
+	frame_size = ((samples_per_frame // 8 // slot_size * bitrate) // sample_rate + padded) * slot_size
+
+	return frame_size, samples_per_frame, sample_rate
+
+
+def _find_mp3_frame(data, offset, end):
+	# Find the next frame header followed by another frame header or the end of the audio
+	# to avoid syncing on 0xFF bytes in audio data.
+	while True:
+		offset = data.find(b'\xFF', offset, end - 3)
+		if offset == -1:
+			return -1
+
+		header = _parse_mp3_frame_header(data, offset)
+		if header is not None:
+			next_offset = offset + header[0]
+
+			if (
+				end - 4 < next_offset <= end
+				or (
+					next_offset < end
+					and _parse_mp3_frame_header(data, next_offset) is not None
+				)
+			):
+				return offset
+
+		offset += 1
+
+
+def _iter_mp3_frames(data, offset, end):
+	while offset + 4 <= end:
+		header = _parse_mp3_frame_header(data, offset)
+
+		if header is None:
+			offset = _find_mp3_frame(data, offset + 1, end)
+			if offset == -1:
+				break
+
+			continue
+
+		if offset + header[0] > end:
+			break
+
+		yield offset, header
+		offset += header[0]
+
+
+def _slice_mp3_frames(data, streaminfo, slice_start, slice_duration, *, lead_frames=0):
+	# Return the frames covering a slice with up to lead_frames frames before it
+	# and the position of the slice in seconds from the first returned frame.
+	start = streaminfo._start
+	end = streaminfo._start + streaminfo._size
+
+	first_frame = _find_mp3_frame(data, start, end)
+	if first_frame == -1:
+		raise ValueError("No MPEG audio frames found.")
+
+	_, samples_per_frame, sample_rate = _parse_mp3_frame_header(data, first_frame)
+
+	if streaminfo._xing is not None or streaminfo._vbri is not None:
+		# The first frame holds the Xing/VBRI header instead of audio.
+		first_frame += _parse_mp3_frame_header(data, first_frame)[0]
+
+	frame_duration = samples_per_frame / sample_rate
+	slice_start = slice_start or 0
+
+	start_index = max(int(slice_start / frame_duration) - lead_frames, 0)
+	if slice_duration is None:
+		end_index = None
+	else:
+		end_index = math.ceil((slice_start + slice_duration) / frame_duration)
+
+	if streaminfo.bitrate_mode == audio_metadata.MP3BitrateMode.CBR:
+		# Frame sizes only differ by padding, so the offset of a frame can be estimated
+		# and synced to instead of walking every frame before it.
+		estimate = first_frame + int(start_index * frame_duration * streaminfo.bitrate / 8)
+		offset = _find_mp3_frame(data, min(estimate, end), end)
+		index = start_index
+
+		if offset == -1:
+			return b'', 0
+	else:
+		offset = first_frame
+		index = 0
+
+	slice_offset = slice_end = None
+	for frame_offset, (frame_size, _, _) in _iter_mp3_frames(data, offset, end):
+		if index == start_index:
+			slice_offset = frame_offset
+
+		index += 1
+
+		if end_index is not None and index >= end_index:
+			slice_end = frame_offset + frame_size
+			break
+
+	if slice_offset is None:
+		return b'', 0
+
+	if slice_end is None:
+		slice_end = end
+
+	return data[slice_offset:slice_end], slice_start - start_index * frame_duration
+
+
+def _load_mp3_metadata(song):
+	if isinstance(song, (bytes, bytearray, memoryview)):
+		metadata = audio_metadata.loads(song)
+	else:
+		metadata = _load_metadata(song)
+
+	if not isinstance(metadata, audio_metadata.MP3):
+		raise ValueError("'song' must be an MP3.")
+
+	return metadata
+
+
+def _slice_mp3(song, slice_start, slice_duration, *, metadata=None, lead_frames=0):
+	if metadata is None:
+		metadata = _load_mp3_metadata(song)
+
+	if isinstance(song, (bytes, bytearray, memoryview)):
+		return _slice_mp3_frames(song, metadata.streaminfo, slice_start, slice_duration, lead_frames=lead_frames)
+
+	if metadata.filepath is None:
+		raise ValueError("Audio metadata must be from a file.")
+
+	with open(metadata.filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+		return _slice_mp3_frames(data, metadata.streaminfo, slice_start, slice_duration, lead_frames=lead_frames)
+
+
+def slice_mp3(song, *, slice_start=None, slice_duration=None):
+	"""Cut a slice of an MP3 file at frame boundaries without transcoding.
+
+	The slice starts at the frame containing ``slice_start`` and ends with
+	the frame containing the end of the slice, so it can be up to a frame longer.
+	Tags and Xing/VBRI header frames aren't included.
+
+	Note:
+		The first frames of the slice may rely on audio data in frames before the slice
+		(the bit reservoir), which decoders skip or decode with a short glitch.
+
+	Parameters:
+		song (os.PathLike or str or bytes or audio_metadata.Format or PreparedSong):
+			The path to an MP3 file, its binary data, an instance of :class:`audio_metadata.Format`,
+			or an instance of :class:`PreparedSong`.
+		slice_start (int, Optional): The position in seconds to start the slice at.
+		slice_duration (int, Optional): The number of seconds of audio to slice.
+
+	Returns:
+		bytes: The MPEG audio frames of the slice.
+
+	Raises:
+		ValueError: If ``song`` isn't an MP3.
+	"""
+
+	sliced, _ = _slice_mp3(song, slice_start, slice_duration)
+
+	return bytes(sliced)
+
+
+class TranscodeBackend:
+	"""The interface of :func:`transcode_to_mp3` backends.
+
+	Backends are tried in the order of :data:`transcode_backends`
+	until one returns output.
+	"""
+
+	#: str: The name of the backend.
+	name = None
+
+	def transcode(
+		self,
+		song,
+		*,
+		slice_start=None,
+		slice_duration=None,
+		quality='320k',
+		seek='output',
+		seek_fallback=True,
+		spool_size=None,
+		timeout=None,
+		timings=None,
+	):
+		"""Transcode an audio file to MP3.
+
+		Parameters are the same as :func:`transcode_to_mp3`.
+		``seek`` and ``seek_fallback`` only affect the speed of a backend, not its output.
+		``timeout`` and ``timings`` only apply to backends that run processes.
+
+		Returns:
+			bytes or mmap.mmap: The transcoded MP3 data,
+			or ``None`` if the backend can't transcode ``song`` at ``quality``.
+		"""
+
+		raise NotImplementedError
+
+
+@attrs(slots=True, frozen=True)
+class FFmpegBackend(TranscodeBackend):
+	"""Transcode in an ffmpeg or avconv process found by :func:`get_transcoder`.
+
+	Supports any input and quality the transcoder does.
+	A transcoder that exceeds its timeout is killed and reaped,
+	as it is if the call is interrupted.
+	Resource limits are set with :func:`resource.prlimit` once a transcoder has started,
+	so they're safe to use from multiple threads, e.g. with :class:`TranscodeScheduler`.
+	They're ignored on platforms without :func:`resource.prlimit`, e.g. macOS and Windows.
+	A transcoder that exceeds them fails with :exc:`subprocess.CalledProcessError`.
+
+	Parameters:
+		timeout (float, Optional):
+			The maximum number of seconds each transcoder process may run.
+			:exc:`subprocess.TimeoutExpired` is raised if exceeded.
+			The ``timeout`` of :func:`transcode_to_mp3` takes precedence.
+			Default: No limit.
+		cpu_time_limit (float, Optional):
+			The maximum number of seconds of CPU time each transcoder process may use.
+			Default: No limit.
+		memory_limit (int, Optional):
+			The maximum number of bytes of address space each transcoder process may use.
+			Default: No limit.
+	"""
+
+	name = 'ffmpeg'
+
+	timeout = attrib(default=None)
+	cpu_time_limit = attrib(default=None)
+	memory_limit = attrib(default=None)
+
+	def transcode(
+		self,
+		song,
+		*,
+		slice_start=None,
+		slice_duration=None,
+		quality='320k',
+		seek='output',
+		seek_fallback=True,
+		spool_size=None,
+		timeout=None,
+		timings=None,
+	):
+		command, input_ = _build_transcode_command(
+			song,
+			slice_start=slice_start,
+			slice_duration=slice_duration,
+			quality=quality,
+			seek=seek,
+		)
+
+		fallback = (
+			seek == 'input'
+			and slice_start is not None
+			and seek_fallback
+		)
+
+		try:
+			output = _transcode(
+				command,
+				input_=input_,
+				spool_size=spool_size,
+				timeout=self.timeout if timeout is None else timeout,
+				cpu_time_limit=self.cpu_time_limit,
+				memory_limit=self.memory_limit,
+				timings=timings,
+			)
+		except subprocess.CalledProcessError:
+			if not fallback:
+				raise
+
+			output = None
+
+		if not output and fallback:
+			output = self.transcode(
+				song,
+				slice_start=slice_start,
+				slice_duration=slice_duration,
+				quality=quality,
+				spool_size=spool_size,
+				timeout=timeout,
+				timings=timings,
+			)
+
+		return output
+
+
+# Sample rates supported by MP3.
+_MP3_SAMPLE_RATES = frozenset(
+	sample_rate
+	for sample_rates in audio_metadata.MP3SampleRates.values()
+	for sample_rate in sample_rates
+)
+
+# The number of PCM frames encoded at a time.
+_PCM_CHUNK_FRAMES = 1152 * 64
+
+
+@attrs(slots=True)
+class _PCMReader:
+	file = attrib()
+	sample_rate = attrib()
+	channels = attrib()
+	frames = attrib()
+	read = attrib()
+	seek = attrib()
+
+	def close(self):
+		self.file.close()
+
+
+def _open_pcm(song):
+	# Open an audio file to read 16-bit little-endian PCM, or return None if it can't be decoded in process.
+	if isinstance(song, PreparedSong):
+		song = song.metadata
+
+	if isinstance(song, audio_metadata.Format):
+		source = song.filepath
+	elif isinstance(song, (bytes, bytearray)):
+		source = io.BytesIO(song)
+	elif isinstance(song, (str, os.PathLike)):
+		source = os.fspath(song)
+	else:
+		source = None
+
+	if source is None:
+		return None
+
+	if soundfile is not None:
+		try:
+			f = soundfile.SoundFile(source)
+		except (OSError, RuntimeError):
+			return None
+
+		return _PCMReader(
+			f,
+			f.samplerate,
+			f.channels,
+			f.frames,
+			lambda frames: bytes(f.buffer_read(frames, dtype='int16')),
+			f.seek,
+		)
+
+	try:
+		f = wave.open(source, 'rb')
+	except (OSError, EOFError, wave.Error):
+		return None
+
+	if f.getsampwidth() != 2:
+		f.close()
+		return None
+
+	return _PCMReader(f, f.getframerate(), f.getnchannels(), f.getnframes(), f.readframes, f.setpos)
+
+
+@attrs(slots=True, frozen=True)
+class LAMEBackend(TranscodeBackend):
+	"""Transcode in process with the ``lameenc`` LAME binding.
+
+	Audio is decoded with ``soundfile`` if installed, else only PCM WAVE files are supported.
+	Unsupported input is left to the next backend.
+	"""
+
+	name = 'lame'
+
+	def transcode(
+		self,
+		song,
+		*,
+		slice_start=None,
+		slice_duration=None,
+		quality='320k',
+		seek='output',
+		seek_fallback=True,
+		spool_size=None,
+		timeout=None,
+		timings=None,
+	):
+		if lameenc is None:
+			return None
+
+		encoder = lameenc.Encoder()
+
+		if isinstance(quality, int):
+			if not hasattr(encoder, 'set_vbr_quality'):
+				return None
+
+			# Same as libmp3lame in ffmpeg with -q:a.
+			encoder.set_vbr(4)
+			encoder.set_vbr_quality(quality)
+		else:
+			bitrate = _parse_bitrate(quality)
+			if bitrate is None:
+				return None
+
+			encoder.set_bit_rate(bitrate // 1000)
+
+		reader = _open_pcm(song)
+		if reader is None:
+			return None
+
+		try:
+			if (
+				reader.sample_rate not in _MP3_SAMPLE_RATES
+				or reader.channels not in (1, 2)
+			):
+				return None
+
+			# Keep the input sample rate like ffmpeg instead of letting LAME resample.
+			encoder.set_in_sample_rate(reader.sample_rate)
+			encoder.set_out_sample_rate(reader.sample_rate)
+			encoder.set_channels(reader.channels)
+
+			start = 0 if slice_start is None else int(slice_start * reader.sample_rate)
+			if start < reader.frames:
+				reader.seek(start)
+				remaining = reader.frames - start
+			else:
+				remaining = 0
+
+			if slice_duration is not None:
+				remaining = min(remaining, int(slice_duration * reader.sample_rate))
+
+			output = tempfile.TemporaryFile() if spool_size is not None else io.BytesIO()
+
+			with output:
+				encoded = False
+				while remaining > 0:
+					frames = min(remaining, _PCM_CHUNK_FRAMES)
+					pcm = reader.read(frames)
+					if not pcm:
+						break
+
+					output.write(encoder.encode(pcm))
+					encoded = True
+					remaining -= frames
+
+				# lameenc can't flush an encoder that hasn't encoded anything.
+				if encoded:
+					output.write(encoder.flush())
+
+				if spool_size is not None:
+					return _read_spool(output, spool_size)
+
+				return output.getvalue()
+		finally:
+			reader.close()
+
+
+#: list: The :class:`TranscodeBackend` instances tried in order by :func:`transcode_to_mp3`.
+#: Insert a backend to have it tried before the defaults.
+transcode_backends = [LAMEBackend(), FFmpegBackend()]
+
+
+def _to_millis(seconds):
+	return None if seconds is None else round(seconds * 1000)
+
+
+def _parse_bitrate(quality):
+	match = _BITRATE_RE.match(quality) if isinstance(quality, str) else None
+
+	return int(match.group(1)) * 1000 if match else None
+
+
+def transcode_to_mp3(
+	song,
+	*,
+	slice_start=None,
+	slice_duration=None,
+	quality='320k',
+	seek='output',
+	seek_fallback=True,
+	native_mp3=False,
+	sample_cache=None,
+	client_id=None,
+	spool_size=None,
+	backend=None,
+	timeout=None,
+	timings=None,
+):
+	"""Transcode an audio file to MP3.
+
+	Parameters:
+		song (os.PathLike or str or bytes or audio_metadata.Format or PreparedSong):
+			The path to an audio file, its binary data, an instance of :class:`audio_metadata.Format`,
+			or an instance of :class:`PreparedSong`.
+		slice_start (int, Optional): The position in seconds to start the transcode at.
+		slice_duration (int, Optional): The number of seconds of audio to transcode.
+		quality (int or str, Optional):
+			A VBR quality (``-q:a``) if an integer, or a CBR bitrate (``-b:a``) if a string.
+			Default: ``'320k'``
+		seek (str, Optional):
+			How to seek to ``slice_start``.
+			``'output'`` decodes and discards the audio before ``slice_start``.
+			``'input'`` seeks in the input file, which is much faster for long files.
+			Default: ``'output'``
+		seek_fallback (bool, Optional):
+			Retry with ``'output'`` seeking if ``'input'`` seeking fails or produces no audio,
+			e.g. for files without seek points.
+			Default: ``True``
+		native_mp3 (bool, Optional):
+			Cut MP3 files at frame boundaries with :func:`slice_mp3` instead of transcoding
+			if their bitrate is at or below a CBR ``quality``.
+			Otherwise, only the frames around a slice of an MP3 file are transcoded.
+			Default: ``False``
+		sample_cache (SampleCache, Optional):
+			A sample cache to consult before transcoding and update after.
+		client_id (str, Optional):
+			The client ID of ``song`` used to key ``sample_cache`` entries.
+			Default: Generated from ``song`` if ``sample_cache`` is given.
+		spool_size (int, Optional):
+			The maximum number of bytes of output to return as :class:`bytes`.
+			Larger output is written by the transcoder to an anonymous temporary file
+			and returned as a read-only :class:`mmap.mmap` of it,
+			so it's paged from disk instead of held in process memory.
+			Close the :class:`mmap.mmap` when done with it.
+			Default: Always return :class:`bytes`.
+		backend (TranscodeBackend, Optional):
+			The backend to transcode with.
+			Default: The first of :data:`transcode_backends` that supports ``song`` and ``quality``.
+		timeout (float, Optional):
+			The maximum number of seconds each transcoder process may run.
+			The transcoder is killed and :exc:`subprocess.TimeoutExpired` is raised if exceeded.
+			Doesn't apply to in-process backends.
+			Default: The ``timeout`` of the backend.
+		timings (list, Optional):
+			A list to append the :class:`TranscodeTiming` of each transcoder process run to.
+
+	Returns:
+		bytes or mmap.mmap: The transcoded MP3 data.
+	"""
+
+	if seek not in ('input', 'output'):
+		raise ValueError("'seek' must be 'input' or 'output'.")
+
+	if sample_cache is not None:
+		if client_id is None:
+			client_id = song.client_id if isinstance(song, PreparedSong) else generate_client_id(song)
+
+		key = (client_id, _to_millis(slice_start), _to_millis(slice_duration), quality)
+
+		output = sample_cache.get(*key, native_mp3=native_mp3)
+		if output is None:
+			output = transcode_to_mp3(
+				song,
+				slice_start=slice_start,
+				slice_duration=slice_duration,
+				quality=quality,
+				seek=seek,
+				seek_fallback=seek_fallback,
+				native_mp3=native_mp3,
+				spool_size=spool_size,
+				backend=backend,
+				timeout=timeout,
+				timings=timings,
+			)
+
+			if output:
+				sample_cache.put(*key, output, native_mp3=native_mp3)
+
+		return output
+
+	if native_mp3:
+		try:
+			metadata = _load_mp3_metadata(song)
+		except (audio_metadata.AudioMetadataException, ValueError):
+			metadata = None
+
+		if metadata is not None:
+			bitrate = _parse_bitrate(quality)
+			if (
+				bitrate is not None
+				and metadata.streaminfo.bitrate <= bitrate
+			):
+				sliced, _ = _slice_mp3(song, slice_start, slice_duration, metadata=metadata)
+
+				return bytes(sliced)
+
+			if slice_start is not None or slice_duration is not None:
+				sliced, slice_start = _slice_mp3(
+					song,
+					slice_start,
+					slice_duration,
+					metadata=metadata,
+					lead_frames=_MP3_LEAD_FRAMES,
+				)
+				song = bytes(sliced)
+				seek = 'output'
+
+	for backend_ in transcode_backends if backend is None else [backend]:
+		output = backend_.transcode(
+			song,
+			slice_start=slice_start,
+			slice_duration=slice_duration,
+			quality=quality,
+			seek=seek,
+			seek_fallback=seek_fallback,
+			spool_size=spool_size,
+			timeout=timeout,
+			timings=timings,
+		)
+
+		if output is not None:
+			return output
+
+	raise ValueError("No transcode backend supports 'song' at 'quality'.")
+
+
+# The amount of transcoder stderr kept for error messages.
+_STDERR_TAIL_SIZE = 64 * 1024
+
+
+class TranscodeStream(io.RawIOBase):
+	"""A readable stream over the output of a transcode command.
+
+	Output is read from the transcoder as it's produced.
+	The transcoder is blocked while output isn't being read,
+	so at most a pipe buffer of output is held in memory.
+
+	Iterating yields chunks of output of up to ``chunk_size`` bytes.
+
+	Closing the stream before the end of output kills the transcoder.
+	If the transcoder fails, reading the end of output raises
+	:exc:`subprocess.CalledProcessError`.
+
+	Parameters:
+		command (list): The transcode command.
+		input_ (bytes, Optional): Data to write to the transcoder's stdin.
+		chunk_size (int, Optional):
+			The maximum size of chunks when iterating.
+			Default: ``65536``
+	"""
+
+	def __init__(self, command, input_=None, *, chunk_size=64 * 1024):
+		super().__init__()
+
+		self.command = command
+		self.chunk_size = chunk_size
+		self._stderr = bytearray()
+
+		try:
+			self._process = subprocess.Popen(
+				command,
+				bufsize=0,
+				stdin=subprocess.DEVNULL if input_ is None else subprocess.PIPE,
+				stdout=subprocess.PIPE,
+				stderr=subprocess.PIPE,
+			)
+		except OSError as e:
+			e.message = _transcode_error_message(command, e, None)
+			raise
+
+		# Drain stderr and feed stdin in threads so neither pipe can fill up
+		# and block the transcoder while output is being read.
+		self._threads = [
+			threading.Thread(target=self._read_stderr, daemon=True),
+		]
+		if input_ is not None:
+			self._threads.append(
+				threading.Thread(target=self._write_stdin, args=(input_,), daemon=True)
+			)
+
+		for thread in self._threads:
+			thread.start()
+
+	def _read_stderr(self):
+		for chunk in iter(lambda: self._process.stderr.read(4096), b''):
+			self._stderr += chunk
+			del self._stderr[:-_STDERR_TAIL_SIZE]
+
+	def _write_stdin(self, input_):
+		try:
+			self._process.stdin.write(input_)
+		except OSError:
+			# The transcoder exited or was killed.
+			pass
+		finally:
+			try:
+				self._process.stdin.close()
+			except OSError:
+				pass
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		chunk = self.read(self.chunk_size)
+		if not chunk:
+			raise StopIteration
+
+		return chunk
+
+	def readable(self):
+		return True
+
+	def readinto(self, b):
+		if self.closed:
+			raise ValueError("I/O operation on closed stream.")
+
+		size = self._process.stdout.readinto(b)
+
+		if not size:
+			self._finish()
+
+		return size
+
+	def _finish(self):
+		returncode = self._process.wait()
+
+		for thread in self._threads:
+			thread.join()
+
+		if returncode != 0:
+			e = subprocess.CalledProcessError(
+				returncode,
+				self.command,
+				stderr=bytes(self._stderr),
+			)
+			e.message = _transcode_error_message(self.command, e, e.stderr)
+
+			raise e
+
+	def close(self):
+		"""Close the stream, killing the transcoder if still running."""
+
+		if self.closed:
+			return
+
+		try:
+			if self._process.poll() is None:
+				self._process.kill()
+
+			self._process.wait()
+			self._process.stdout.close()
+
+			for thread in self._threads:
+				thread.join()
+
+			self._process.stderr.close()
+		finally:
+			super().close()
+
+
+def transcode_to_mp3_stream(
+	song, *, slice_start=None, slice_duration=None, quality='320k', seek='output', chunk_size=64 * 1024
+):
+	"""Transcode an audio file to MP3 as a stream of output.
+
+	Takes the same arguments as :func:`transcode_to_mp3`.
+	Unlike :func:`transcode_to_mp3`, the output is never held in memory all at once.
+	There is no ``seek_fallback`` as output may already have been read.
+
+	Parameters:
+		chunk_size (int, Optional):
+			The maximum size of chunks when iterating over the stream.
+			Default: ``65536``
+
+	Returns:
+		TranscodeStream: A readable stream of MP3 data.
+		Close it, or use it as a context manager, to clean up the transcoder.
+	"""
+
+	command, input_ = _build_transcode_command(
+		song,
+		slice_start=slice_start,
+		slice_duration=slice_duration,
+		quality=quality,
+		seek=seek,
+	)
+
+	return TranscodeStream(command, input_, chunk_size=chunk_size)
@@ -0,0 +1,163 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from google_music_proto.musicmanager import aio, utils
+from google_music_proto.musicmanager.aio import AsyncExecutor
+
+TEST_FILES_PATH = Path(__file__).parent / 'files'
+TEST_FLAC = TEST_FILES_PATH / 'test.flac'
+TEST_WAV = TEST_FILES_PATH / 'test.wav'
+
+
+def run(coro):
+	return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_async_executor():
+	async def main():
+		async with AsyncExecutor(max_workers=2) as executor:
+			return await asyncio.gather(
+				executor.generate_client_id(TEST_FLAC),
+				executor.generate_client_id(TEST_WAV),
+				executor.get_track_info(TEST_WAV),
+			)
+
+	flac_client_id, wav_client_id, track = run(main())
+
+	assert flac_client_id == 'mxvofGtXn94jQVFfTYLACA'
+	assert wav_client_id == 'AaaDJcxutpaqPAmqSZg4gg'
+	assert track.client_id == wav_client_id
+
+
+def test_async_executor_cancel():
+	async def main():
+		async with AsyncExecutor(max_workers=1) as executor:
+			running = asyncio.ensure_future(executor.run(time.sleep, 0.2))
+			waiting = asyncio.ensure_future(executor.run(time.sleep, 10))
+			await asyncio.sleep(0.05)
+
+			waiting.cancel()
+			with pytest.raises(asyncio.CancelledError):
+				await waiting
+
+			await running
+
+			# The cancelled call never reached the executor.
+			return await asyncio.wait_for(executor.run(sum, [1, 2]), 1)
+
+	assert run(main()) == 3
+
+
+def test_transcode_to_mp3(monkeypatch):
+	commands = []
+
+	async def iter_transcode(command, input_=None, **kwargs):
+		commands.append(command)
+		yield b'mp3'
+
+	threads = []
+
+	def get_transcoder():
+		threads.append(threading.current_thread())
+		return 'ffmpeg'
+
+	monkeypatch.setattr(utils, 'get_transcoder', get_transcoder)
+	monkeypatch.setattr(aio, '_iter_transcode', iter_transcode)
+
+	assert run(aio.transcode_to_mp3(TEST_FLAC, slice_start=15, slice_duration=30, quality=5)) == b'mp3'
+	assert run(aio.transcode_to_mp3(str(TEST_FLAC))) == b'mp3'
+
+	# The transcoder is found outside of the event loop.
+	assert threading.current_thread() not in threads
+
+	assert commands == [
+		[
+			'ffmpeg', '-i', str(TEST_FLAC), '-t', '30', '-ss', '15', '-q:a', '5',
+			'-f', 's16le', '-c', 'libmp3lame', '-',
+		],
+		[
+			'ffmpeg', '-i', str(TEST_FLAC), '-b:a', '320k',
+			'-f', 's16le', '-c', 'libmp3lame', '-',
+		],
+	]
+
+
+# The default event loop doesn't support subprocesses on Windows before Python 3.8.
+requires_subprocess_support = pytest.mark.skipif(
+	sys.platform == 'win32' and sys.version_info < (3, 8),
+	reason="Event loop doesn't support subprocesses.",
+)
+
+
+def _collect(command, input_=None, **kwargs):
+	async def main():
+		return [
+			chunk
+			async for chunk in aio._iter_transcode(command, input_, **kwargs)
+		]
+
+	return run(main())
+
+
+@requires_subprocess_support
+def test_iter_transcode():
+	command = [
+		sys.executable,
+		'-c',
+		'import sys; sys.stdout.buffer.write(sys.stdin.buffer.read() * 3)',
+	]
+
+	chunks = _collect(command, b'\x00' * 100000, chunk_size=4096)
+	assert all(len(chunk) <= 4096 for chunk in chunks)
+	assert b''.join(chunks) == b'\x00' * 300000
+
+	with pytest.raises(subprocess.CalledProcessError) as exc_info:
+		_collect([sys.executable, '-c', 'import sys; sys.stderr.write("error"); sys.exit(1)'])
+
+	assert exc_info.value.stderr == b'error'
+
+
+@requires_subprocess_support
+def test_iter_transcode_timeout():
+	command = [sys.executable, '-c', 'import time; time.sleep(10)']
+
+	start = time.monotonic()
+	with pytest.raises(subprocess.TimeoutExpired):
+		_collect(command, timeout=0.2)
+
+	assert time.monotonic() - start < 5
+
+
+@requires_subprocess_support
+def test_iter_transcode_cancel(monkeypatch):
+	command = [sys.executable, '-c', 'import time; time.sleep(10)']
+	processes = []
+
+	create_subprocess_exec = asyncio.create_subprocess_exec
+
+	async def track_subprocess(*args, **kwargs):
+		process = await create_subprocess_exec(*args, **kwargs)
+		processes.append(process)
+		return process
+
+	async def main():
+		async def consume():
+			async for _ in aio._iter_transcode(command):
+				pass
+
+		task = asyncio.ensure_future(consume())
+		await asyncio.sleep(0.2)
+		task.cancel()
+
+		with pytest.raises(asyncio.CancelledError):
+			await task
+
+	monkeypatch.setattr(asyncio, 'create_subprocess_exec', track_subprocess)
+	run(main())
+
+	assert processes[0].returncode is not None
@@ -0,0 +1,203 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+from google_music_proto.musicmanager import utils
+from google_music_proto.musicmanager.cache import (
+	AlbumArtCache,
+	ClientIDCache,
+	SampleCache,
+)
+from google_music_proto.musicmanager.utils import (
+	generate_client_id,
+	generate_client_ids,
+	transcode_to_mp3,
+)
+
+TEST_FILES_PATH = Path(__file__).parent / 'files'
+TEST_FLAC = TEST_FILES_PATH / 'test.flac'
+TEST_WAV = TEST_FILES_PATH / 'test.wav'
+
+
+def test_album_art_cache():
+	cache = AlbumArtCache(max_size=16)
+
+	album_art = b'\x00' * 6
+	assert cache.put(album_art) is album_art
+	assert cache.put(bytes(album_art)) is album_art
+	assert cache.get(cache.digest(album_art)) is album_art
+	assert cache.size == 6
+
+	assert cache.b64encode(album_art) == 'AAAAAAAA'
+	assert cache.size == 14
+
+	# A precomputed digest is used as given.
+	digest = cache.digest(album_art)
+	assert cache.put(bytes(album_art), digest=digest) is album_art
+	assert cache.b64encode(bytes(album_art), digest=digest) == 'AAAAAAAA'
+	assert cache.size == 14
+
+	# Evicts the least recently used album art to fit the budget.
+	cache.b64encode(b'\x01' * 3)
+	assert cache.digest(album_art) not in cache
+	assert cache.get(cache.digest(album_art)) is None
+	assert len(cache) == 1
+	assert cache.size == 7
+
+	cache.clear()
+	assert len(cache) == 0
+	assert cache.size == 0
+
+
+@pytest.fixture
+def client_id_cache(tmp_path):
+	with ClientIDCache(tmp_path / 'client_ids.db') as cache:
+		yield cache
+
+
+def test_client_id_cache(client_id_cache, tmp_path):
+	song = tmp_path / 'test.wav'
+	shutil.copy(TEST_WAV, song)
+
+	assert client_id_cache.get(song) is None
+	assert generate_client_id(song, cache=client_id_cache) == 'AaaDJcxutpaqPAmqSZg4gg'
+	assert client_id_cache.get(song) == 'AaaDJcxutpaqPAmqSZg4gg'
+	assert len(client_id_cache) == 1
+
+	# A changed file is a cache miss.
+	stat = song.stat()
+	os.utime(song, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+	assert client_id_cache.get(song) is None
+
+	client_id_cache.put(song, 'client-id')
+	assert client_id_cache.get(song) == 'client-id'
+	assert len(client_id_cache) == 1
+
+	client_id_cache.invalidate(song)
+	assert client_id_cache.get(song) is None
+	assert len(client_id_cache) == 0
+
+
+def test_generate_client_ids_cache(client_id_cache, monkeypatch):
+	client_id_cache.put(TEST_FLAC, 'flac')
+	client_id_cache.put(TEST_WAV, 'wav')
+
+	def executor(*args, **kwargs):
+		raise AssertionError("No worker processes should be started.")
+
+	monkeypatch.setattr(utils, 'ProcessPoolExecutor', executor)
+
+	read = []
+
+	def songs():
+		for song in [TEST_FLAC, TEST_WAV]:
+			read.append(song)
+			yield song
+
+	# Cached client IDs are yielded as they're read.
+	results = generate_client_ids(songs(), cache=client_id_cache)
+	assert next(results) == (TEST_FLAC, 'flac')
+	assert read == [TEST_FLAC]
+	assert list(results) == [(TEST_WAV, 'wav')]
+
+	monkeypatch.undo()
+	client_id_cache.invalidate(TEST_WAV)
+
+	results = dict(generate_client_ids([TEST_FLAC, TEST_WAV], workers=1, cache=client_id_cache))
+	assert results == {TEST_FLAC: 'flac', TEST_WAV: 'AaaDJcxutpaqPAmqSZg4gg'}
+	assert client_id_cache.get(TEST_WAV) == 'AaaDJcxutpaqPAmqSZg4gg'
+
+
+def test_client_id_cache_eviction(tmp_path):
+	with ClientIDCache(tmp_path / 'client_ids.db', max_entries=1) as cache:
+		cache.put(TEST_FLAC, 'flac')
+		cache.put(TEST_WAV, 'wav')
+
+		assert len(cache) == 1
+		assert cache.get(TEST_FLAC) is None
+		assert cache.get(TEST_WAV) == 'wav'
+
+		cache.clear()
+		assert len(cache) == 0
+
+
+def test_client_id_cache_persistence(tmp_path):
+	with ClientIDCache(tmp_path / 'client_ids.db') as cache:
+		cache.put(TEST_WAV, 'wav')
+
+	with ClientIDCache(tmp_path / 'client_ids.db') as cache:
+		assert len(cache) == 1
+		assert cache.get(TEST_WAV) == 'wav'
+
+
+def test_sample_cache(tmp_path):
+	cache = SampleCache(tmp_path / 'samples', max_size=10)
+
+	assert cache.get('client-id', 15000, 30000, '128k') is None
+
+	cache.put('client-id', 15000, 30000, '128k', b'sample')
+	assert cache.get('client-id', 15000, 30000, '128k') == b'sample'
+	assert cache.get('client-id', 15000, 30000, '320k') is None
+	assert ('client-id', 15000, 30000, '128k') in cache
+	assert cache.size == 6
+
+	# Entries are tagged by how they were made, and int and str qualities are distinct.
+	assert cache.get('client-id', 15000, 30000, '128k', native_mp3=True) is None
+	cache.put('client-id', 0, 30000, 5, b'vbr')
+	assert cache.get('client-id', 0, 30000, '5') is None
+	cache.clear()
+	cache.put('client-id', 15000, 30000, '128k', b'sample')
+
+	# No temporary files are left behind.
+	assert len(list((tmp_path / 'samples').iterdir())) == 1
+
+	# Evicts the least recently used samples to fit the budget.
+	cache.put('client-id', 0, 30000, '128k', b'other')
+	assert cache.get('client-id', 15000, 30000, '128k') is None
+	assert len(cache) == 1
+	assert cache.size == 5
+
+	# Samples are found again when the cache is reopened.
+	cache = SampleCache(tmp_path / 'samples', max_size=10)
+	assert len(cache) == 1
+	assert cache.get('client-id', 0, 30000, '128k') == b'other'
+
+	# Samples stored by another instance sharing the directory are found when read.
+	other = SampleCache(tmp_path / 'samples', max_size=10)
+	cache.put('client-id', 30000, 30000, '128k', b'new')
+	assert ('client-id', 30000, 30000, '128k') in other
+	assert other.get('client-id', 30000, 30000, '128k') == b'new'
+	assert len(other) == 2
+	assert other.size == 8
+
+	cache.clear()
+	assert len(cache) == 0
+	assert not list((tmp_path / 'samples').iterdir())
+
+
+def test_transcode_to_mp3_sample_cache(monkeypatch, tmp_path):
+	commands = []
+
+	def transcode(command, input_=None, **kwargs):
+		commands.append(command)
+		return b'mp3'
+
+	monkeypatch.setattr(utils, 'get_transcoder', lambda: 'ffmpeg')
+	monkeypatch.setattr(utils, '_transcode', transcode)
+	monkeypatch.setattr(utils, 'transcode_backends', [utils.FFmpegBackend()])
+
+	cache = SampleCache(tmp_path)
+
+	for _ in range(2):
+		assert transcode_to_mp3(TEST_WAV, slice_start=1, slice_duration=2, quality='128k', sample_cache=cache) == b'mp3'
+
+	assert len(commands) == 1
+	assert cache.get('AaaDJcxutpaqPAmqSZg4gg', 1000, 2000, '128k') == b'mp3'
+
+	transcode_to_mp3(TEST_WAV, slice_start=1, slice_duration=2, quality='128k', sample_cache=cache, client_id='other')
+	assert len(commands) == 2
+
+	transcode_to_mp3(TEST_WAV, slice_start=1, slice_duration=2, quality='128k', sample_cache=cache, native_mp3=True)
+	assert len(commands) == 3
+	assert cache.get('AaaDJcxutpaqPAmqSZg4gg', 1000, 2000, '128k', native_mp3=True) == b'mp3'
@@ -0,0 +1,138 @@
+import io
+import mmap
+from hashlib import md5
+from pathlib import Path
+
+from google_music_proto.musicmanager.cache import ClientIDCache
+from google_music_proto.musicmanager.calls import (
+	Metadata,
+	Sample,
+	ScottyAgentPost,
+	ScottyAgentPut,
+)
+from google_music_proto.musicmanager.pb import upload_pb2
+from google_music_proto.musicmanager.tags import (
+	TagMapping,
+	TrackInfoMapper,
+)
+from google_music_proto.musicmanager.utils import (
+	PreparedSong,
+	get_album_art,
+)
+
+TEST_FILES_PATH = Path(__file__).parent / 'files'
+TEST_FLAC = TEST_FILES_PATH / 'test.flac'
+TEST_WAV = TEST_FILES_PATH / 'test.wav'
+
+
+def _inlined(call):
+	return {
+		field['inlined']['name']: field['inlined']['content']
+		for field in call._data['createSessionRequest']['fields']
+		if 'inlined' in field
+	}
+
+
+def test_get_track_info_album_art_hash():
+	album_art_hash = md5(get_album_art(TEST_FLAC)).hexdigest()
+
+	# Only added when asked for.
+	assert not Metadata.get_track_info(TEST_FLAC).track_extras.additional_metadata
+
+	track = Metadata.get_track_info(TEST_FLAC, album_art_hash=True)
+	assert [
+		(additional_metadata.tag_name, additional_metadata.value)
+		for additional_metadata in track.track_extras.additional_metadata
+	] == [('ALBUM_ART_HASH', album_art_hash.encode())]
+
+	assert Metadata.get_track_info(PreparedSong(TEST_FLAC), album_art_hash=True) == track
+	assert not Metadata.get_track_info(TEST_WAV, album_art_hash=True).track_extras.additional_metadata
+
+	track = Metadata.get_track_info(TEST_WAV, external_art=b'external', album_art_hash=True)
+	assert track.track_extras.additional_metadata[0].value == md5(b'external').hexdigest().encode()
+
+
+def test_get_track_info_prepared_song():
+	song = PreparedSong(TEST_FLAC)
+
+	track = Metadata.get_track_info(song)
+	assert song.track is track
+	assert Metadata.get_track_info(song) is track
+	assert Metadata.get_track_infos([song])[0] is track
+
+	# The cached track isn't used or replaced when made with other options.
+	external_track = Metadata.get_track_info(song, external_art=b'external', album_art_hash=True)
+	assert external_track.track_extras.additional_metadata[0].value == md5(b'external').hexdigest().encode()
+	assert song.track is track
+
+	mapper = TrackInfoMapper([TagMapping('title', 'title', lambda values: 'mapped')])
+	assert Metadata.get_track_info(song, mapper=mapper).title == 'mapped'
+	assert song.track is track
+
+
+def test_get_track_info_prepared_song_cache(tmp_path):
+	song = PreparedSong(TEST_FLAC)
+
+	# The client ID of a prepared song is written through to the cache given.
+	with ClientIDCache(tmp_path / 'client_ids.db') as cache:
+		track = Metadata.get_track_info(song, cache=cache)
+		assert cache.get(TEST_FLAC) == track.client_id == song.client_id
+
+
+def test_known_album_art():
+	track = Metadata.get_track_info(TEST_FLAC, album_art_hash=True)
+	album_art_hash = md5(get_album_art(TEST_FLAC)).hexdigest()
+
+	for known_album_art, has_album_art in [(None, True), (set(), True), ({album_art_hash}, False)]:
+		track_sample = Sample.generate_sample(
+			TEST_FLAC,
+			track,
+			upload_pb2.SignedChallengeInfo(),
+			no_sample=True,
+			known_album_art=known_album_art,
+		)
+		assert track_sample.HasField('user_album_art') is has_album_art
+
+		call = ScottyAgentPost(
+			'uploader-id',
+			'server-track-id',
+			track,
+			TEST_FLAC,
+			known_album_art=known_album_art,
+		)
+		assert ('AlbumArt' in _inlined(call)) is has_album_art
+
+
+def test_scotty_agent_post_file():
+	track = Metadata.get_track_info(TEST_FLAC)
+
+	with open(TEST_FLAC, 'rb') as f:
+		call = ScottyAgentPost('uploader-id', 'server-track-id', track, f)
+
+	assert call._data == ScottyAgentPost('uploader-id', 'server-track-id', track, TEST_FLAC)._data
+	assert 'AlbumArt' in _inlined(call)
+
+
+def test_scotty_agent_put_stream():
+	data = TEST_FLAC.read_bytes()
+
+	assert ScottyAgentPut('url', TEST_FLAC).body == data
+
+	call = ScottyAgentPut('url', io.BytesIO(data), stream=True)
+	assert not isinstance(call.body, bytes)
+	assert b''.join(call.body) == data
+
+	call = ScottyAgentPut('url', TEST_FLAC, stream=True)
+	assert b''.join(call.body) == data
+
+
+def test_scotty_agent_put_mmap(tmp_path):
+	filepath = tmp_path / 'test.flac'
+	filepath.write_bytes(TEST_FLAC.read_bytes())
+
+	with open(filepath, 'rb') as f:
+		audio_file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+	with audio_file:
+		assert ScottyAgentPut('url', audio_file).body is audio_file
+		assert ScottyAgentPut('url', audio_file, stream=True).body is audio_file
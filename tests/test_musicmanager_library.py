@@ -0,0 +1,73 @@
+import shutil
+from pathlib import Path
+
+from google_music_proto.musicmanager.library import (
+	ClientIDIndex,
+	ScanManifest,
+	scan_library,
+)
+from google_music_proto.musicmanager.pb import locker_pb2
+
+TEST_FILES_PATH = Path(__file__).parent / 'files'
+
+
+def test_scan_library(tmp_path):
+	for filename in ['test.flac', 'test-id3v1.mp3', 'test.wav']:
+		shutil.copy(TEST_FILES_PATH / filename, tmp_path / filename)
+
+	(tmp_path / 'cover.jpg').write_bytes(b'')
+	(tmp_path / 'broken.mp3').write_bytes(b'')
+
+	manifest = ScanManifest()
+	results = dict(scan_library(tmp_path, workers=2, chunksize=1, manifest=manifest))
+
+	assert set(results) == {
+		str(tmp_path / filename)
+		for filename in ['test.flac', 'test-id3v1.mp3', 'test.wav', 'broken.mp3']
+	}
+	assert isinstance(results[str(tmp_path / 'test.flac')], locker_pb2.Track)
+	assert results[str(tmp_path / 'test.flac')].client_id == 'mxvofGtXn94jQVFfTYLACA'
+	assert isinstance(results[str(tmp_path / 'broken.mp3')], Exception)
+	assert len(manifest.entries) == 3
+
+	manifest.save(tmp_path / 'manifest.json')
+	manifest = ScanManifest.load(tmp_path / 'manifest.json')
+
+	(tmp_path / 'test.wav').write_bytes((TEST_FILES_PATH / 'test.wav').read_bytes() + b'\x00\x00\x00\x00')
+	results = dict(scan_library(tmp_path, workers=2, manifest=manifest))
+
+	assert set(results) == {str(tmp_path / 'test.wav'), str(tmp_path / 'broken.mp3')}
+
+
+def test_client_id_index(tmp_path):
+	for filename in ['a.flac', 'b.flac']:
+		shutil.copy(TEST_FILES_PATH / 'test.flac', tmp_path / filename)
+	shutil.copy(TEST_FILES_PATH / 'test.wav', tmp_path / 'c.wav')
+
+	index = ClientIDIndex()
+	results = list(scan_library(tmp_path, workers=2))
+	assert index.update(results) is None
+	assert len(index) == 2
+
+	index = ClientIDIndex()
+	assert list(index.index_results(results)) == results
+	assert len(index) == 2
+	assert index.duplicates() == {
+		'mxvofGtXn94jQVFfTYLACA': {str(tmp_path / 'a.flac'), str(tmp_path / 'b.flac')},
+	}
+	assert index.representatives()['mxvofGtXn94jQVFfTYLACA'] == str(tmp_path / 'a.flac')
+
+	index.save(tmp_path / 'index.json')
+	other = ClientIDIndex.load(tmp_path / 'index.json')
+	assert other.paths == index.paths
+
+	other = ClientIDIndex()
+	other.add('other-client-id', tmp_path / 'b.flac')
+	index.merge(other)
+
+	assert index.get_client_id(tmp_path / 'b.flac') == 'other-client-id'
+	assert index.duplicates() == {}
+	assert len(index) == 3
+
+	index.remove(tmp_path / 'b.flac')
+	assert 'other-client-id' not in index
@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+from google_music_proto.musicmanager.scheduler import TranscodeScheduler
+
+
+def test_transcode_scheduler():
+	started = threading.Event()
+	release = threading.Event()
+	order = []
+
+	def block():
+		started.set()
+		release.wait()
+
+	def fail():
+		raise ValueError
+
+	with TranscodeScheduler(max_workers=1) as scheduler:
+		scheduler.submit(block)
+		started.wait()
+
+		futures = [
+			scheduler.submit(order.append, 'low', priority=1),
+			scheduler.submit(order.append, 'high-1', priority=-1),
+			scheduler.submit(order.append, 'high-2', priority=-1),
+			scheduler.submit(fail),
+		]
+		cancelled = scheduler.submit(order.append, 'cancelled', priority=2)
+		assert cancelled.cancel()
+
+		release.set()
+
+		with pytest.raises(ValueError):
+			futures[-1].result()
+
+		for future in futures[:-1]:
+			future.result()
+
+	assert order == ['high-1', 'high-2', 'low']
+
+	stats = scheduler.stats
+	assert stats.submitted == 6
+	assert stats.completed == 4
+	assert stats.failed == 1
+	assert stats.cancelled == 1
+	assert stats.finished == 5
+	assert stats.max_queue_wait > 0
+	assert stats.mean_queue_wait <= stats.max_queue_wait
+
+	with pytest.raises(RuntimeError):
+		scheduler.submit(order.append, 'shutdown')
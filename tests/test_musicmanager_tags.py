@@ -0,0 +1,126 @@
+from pathlib import Path
+
+import audio_metadata
+import pytest
+from google_music_proto.musicmanager.calls import Metadata
+from google_music_proto.musicmanager.pb import locker_pb2
+from google_music_proto.musicmanager.tags import (
+	TagMapping,
+	TrackInfoMapper,
+	parse_number_total,
+	parse_year,
+	track_info_mapper,
+)
+
+TEST_FILES_PATH = Path(__file__).parent / 'files'
+TEST_FLAC = TEST_FILES_PATH / 'test.flac'
+TEST_MP3_ID3V2 = TEST_FILES_PATH / 'test-id3v2.mp3'
+TEST_WAV = TEST_FILES_PATH / 'test.wav'
+
+
+@pytest.mark.parametrize(
+	'value,expected',
+	[
+		('1', (1, None)),
+		('1/12', (1, 12)),
+		('1/x', (1, None)),
+		('1/12/3', (1, None)),
+	]
+)
+def test_parse_number_total(value, expected):
+	assert parse_number_total([value]) == expected
+
+
+def test_parse_number_total_invalid():
+	with pytest.raises(ValueError):
+		parse_number_total(['x/12'])
+
+
+def test_track_info_mapper():
+	metadata = audio_metadata.load(TEST_FLAC)
+	track = track_info_mapper.apply(metadata, locker_pb2.Track())
+
+	assert track.artist == 'test-artist'
+	assert track.album == 'test-album'
+	assert track.title == 'test-title'
+	assert track.genre == 'test-genre'
+	assert track.year == 2000
+	assert (track.disc_number, track.total_disc_count) == (1, 99)
+	assert (track.track_number, track.total_track_count) == (1, 99)
+	assert not track.HasField('album_artist')
+
+	metadata = audio_metadata.load(TEST_MP3_ID3V2)
+	track = track_info_mapper.apply(metadata, locker_pb2.Track())
+	assert (track.track_number, track.total_track_count) == (1, 99)
+
+	# Missing artist/album/title fall back to defaults.
+	metadata = audio_metadata.load(TEST_WAV)
+	track = track_info_mapper.apply(metadata, locker_pb2.Track())
+	assert track.HasField('artist') and track.artist == ''
+	assert track.title == 'test.wav'
+
+
+def test_track_info_mapper_extend():
+	metadata = audio_metadata.load(TEST_FLAC)
+	metadata.tags.comment = ['comment']
+	metadata.tags.tracknumber = ['invalid']
+
+	mapper = track_info_mapper.extend(
+		[
+			TagMapping('comment', 'comment', lambda values: values[0].upper()),
+			TagMapping('missing', 'rating', default=lambda metadata: locker_pb2.Track.FIVE_STARS),
+		]
+	)
+	assert mapper.mappings[:-2] == track_info_mapper.mappings
+
+	track = mapper.apply(metadata, locker_pb2.Track())
+	assert track.comment == 'COMMENT'
+	assert track.rating == locker_pb2.Track.FIVE_STARS
+	# Invalid values are skipped; later mappings still apply.
+	assert not track.HasField('track_number')
+	assert track.total_track_count == 99
+
+	mapper = TrackInfoMapper([TagMapping('genre', 'genre')])
+	assert mapper.apply_many(
+		[(metadata, locker_pb2.Track()), (metadata, locker_pb2.Track())]
+	) == [locker_pb2.Track(genre='test-genre')] * 2
+
+
+def test_get_track_infos():
+	mapper = track_info_mapper.extend([TagMapping('genre', 'comment')])
+
+	tracks = Metadata.get_track_infos([TEST_FLAC, TEST_WAV], mapper=mapper)
+	assert [track.client_id for track in tracks] == [
+		Metadata.get_track_info(TEST_FLAC).client_id,
+		Metadata.get_track_info(TEST_WAV).client_id,
+	]
+	assert tracks[0].comment == 'test-genre'
+	assert not tracks[1].HasField('comment')
+
+
+@pytest.mark.parametrize(
+	'date,expected',
+	[
+		('2000', 2000),
+		('2000-05', 2000),
+		('2000-05-17', 2000),
+		('1999-12-31T10:00:00', 1999),
+		('2000-13-01', None),
+		('2000-02-30', None),
+		('0000', None),
+		('garbage', None),
+		('', None),
+	]
+)
+def test_parse_year(date, expected):
+	assert parse_year(date) == expected
+	assert parse_year(date) == expected
+
+
+def test_parse_year_memoized():
+	parse_year.cache_clear()
+
+	parse_year('1999-12-31T10:00:00')
+	parse_year('1999-12-31T10:00:00')
+
+	assert parse_year.cache_info().hits == 1
@@ -1,15 +1,32 @@
+import mmap
+import subprocess
+import sys
+import time
 from pathlib import Path
 
+import audio_metadata
 import pytest
+from google_music_proto.musicmanager import utils
+from google_music_proto.musicmanager.cache import AlbumArtCache
 from google_music_proto.musicmanager.utils import (
+	ClientIDHasher,
+	LAMEBackend,
+	PreparedSong,
+	TranscodeBackend,
+	TranscodeStream,
+	TranscoderRegistry,
 	generate_client_id,
+	generate_client_ids,
 	get_album_art,
+	slice_mp3,
+	transcode_to_mp3,
 )
 
 TEST_FILES_PATH = Path(__file__).parent / 'files'
 TEST_FLAC = TEST_FILES_PATH / 'test.flac'
 TEST_MP3_ID3V1 = TEST_FILES_PATH / 'test-id3v1.mp3'
 TEST_MP3_ID3V2 = TEST_FILES_PATH / 'test-id3v2.mp3'
+TEST_OGG_VORBIS = TEST_FILES_PATH / 'test.ogg'
 TEST_WAV = TEST_FILES_PATH / 'test.wav'
 
 
@@ -28,6 +45,10 @@ TEST_WAV = TEST_FILES_PATH / 'test.wav'
 			TEST_MP3_ID3V2,
 			'sFbjnunOBS+hwjB0UQXCvQ',
 		),
+		(
+			TEST_OGG_VORBIS,
+			'4uxPGOzFJ2Ln6tVEZi5MFg',
+		),
 		(
 			TEST_WAV,
 			'AaaDJcxutpaqPAmqSZg4gg',
@@ -36,6 +57,18 @@ TEST_WAV = TEST_FILES_PATH / 'test.wav'
 )
 def test_generate_client_id(song, expected):
 	assert generate_client_id(song) == expected
+	assert generate_client_id(song, use_mmap=False) == expected
+
+
+def test_get_album_art_format():
+	for song in [TEST_FLAC, TEST_FILES_PATH / 'test-back-cover.mp3', TEST_WAV]:
+		assert get_album_art(audio_metadata.load(song)) == get_album_art(song)
+
+
+def test_get_album_art_file():
+	for song in [TEST_FLAC, TEST_FILES_PATH / 'test-back-cover.mp3', TEST_WAV]:
+		with open(song, 'rb') as f:
+			assert get_album_art(f) == get_album_art(song)
 
 
 def test_get_album_art():
@@ -69,3 +102,464 @@ def test_get_album_art():
 		b'\x10\x00\x01\x85?\xaar\x00\x00\x00'
 		b'\x00IEND\xaeB`\x82'
 	)
+
+
+def _apic_frame(picture_type, image_data, mime_type=b'image/png'):
+	frame_data = b'\x00' + mime_type + b'\x00' + bytes([picture_type]) + b'\x00' + image_data
+
+	return b'APIC' + len(frame_data).to_bytes(4, 'big') + b'\x00\x00' + frame_data
+
+
+def _pic_frame(picture_type, image_data, image_format=b'PNG'):
+	frame_data = b'\x00' + image_format + bytes([picture_type]) + b'\x00' + image_data
+
+	return b'PIC' + len(frame_data).to_bytes(3, 'big') + frame_data
+
+
+def _write_id3v2_mp3(filepath, frames, major=3):
+	tag_size = bytes(
+		(len(frames) >> shift) & 0x7F
+		for shift in (21, 14, 7, 0)
+	)
+
+	filepath.write_bytes(b'ID3' + bytes([major]) + b'\x00\x00' + tag_size + frames + TEST_MP3_ID3V1.read_bytes())
+
+
+def test_get_album_art_skips_non_images(tmp_path):
+	png = get_album_art(TEST_MP3_ID3V2)
+	frames = b''.join(
+		[
+			_apic_frame(3, b'-->', mime_type=b'-->'),
+			_apic_frame(3, b'not an image'),
+			_apic_frame(0, png),
+		]
+	)
+
+	song = tmp_path / 'test.mp3'
+	_write_id3v2_mp3(song, frames)
+
+	with pytest.warns(audio_metadata.AudioMetadataWarning):
+		metadata = audio_metadata.load(song)
+
+	assert get_album_art(song) == get_album_art(metadata) == png
+
+
+def test_get_album_art_id3v22(tmp_path):
+	png = get_album_art(TEST_MP3_ID3V2)
+	back_cover = png[:24] + b'back cover'
+	frames = _pic_frame(4, back_cover) + _pic_frame(3, png)
+
+	song = tmp_path / 'test.mp3'
+	_write_id3v2_mp3(song, frames, major=2)
+
+	metadata = audio_metadata.load(song)
+	assert [
+		(picture.type, picture.data)
+		for picture in metadata.pictures
+	] == [(4, back_cover), (3, png)]
+
+	with open(song, 'rb') as f:
+		assert [
+			picture_type
+			for picture_type, _ in utils._index_pictures(f)
+		] == [4, 3]
+
+	assert get_album_art(song) == get_album_art(metadata) == png
+
+
+@pytest.mark.parametrize(
+	'song',
+	[
+		TEST_FLAC,
+		TEST_MP3_ID3V1,
+		TEST_MP3_ID3V2,
+		TEST_OGG_VORBIS,
+		TEST_WAV,
+	],
+)
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096, 1024 * 1024])
+def test_client_id_hasher(song, chunk_size):
+	data = song.read_bytes()
+
+	hasher = ClientIDHasher()
+	for i in range(0, len(data), chunk_size):
+		hasher.update(data[i:i + chunk_size])
+
+	assert hasher.finalize() == generate_client_id(song)
+
+	with pytest.raises(ValueError):
+		hasher.update(b'')
+
+
+def test_client_id_hasher_invalid():
+	hasher = ClientIDHasher()
+	hasher.update(TEST_WAV.read_bytes()[:30])
+
+	with pytest.raises(ValueError):
+		hasher.finalize()
+
+
+def test_generate_client_ids():
+	songs = [TEST_FLAC, TEST_MP3_ID3V1, TEST_WAV, TEST_FILES_PATH / 'missing.mp3']
+
+	results = dict(generate_client_ids(songs, workers=2, chunksize=1))
+
+	assert results[TEST_FLAC] == 'mxvofGtXn94jQVFfTYLACA'
+	assert results[TEST_MP3_ID3V1] == 'sFbjnunOBS+hwjB0UQXCvQ'
+	assert results[TEST_WAV] == 'AaaDJcxutpaqPAmqSZg4gg'
+	assert isinstance(results[TEST_FILES_PATH / 'missing.mp3'], Exception)
+
+
+def test_prepared_song():
+	song = PreparedSong(TEST_MP3_ID3V2)
+
+	assert song.filepath == str(TEST_MP3_ID3V2)
+	assert song.client_id == 'sFbjnunOBS+hwjB0UQXCvQ'
+	assert song.album_art == get_album_art(song.metadata)
+	assert song.album_art_b64.startswith('iVBORw0KGgo')
+	assert song.track is None
+
+	assert PreparedSong(TEST_MP3_ID3V1).album_art_b64 is None
+	assert PreparedSong(TEST_MP3_ID3V1, external_art=b'art').album_art_b64 == 'YXJ0'
+
+
+def test_prepared_song_album_art_digest(monkeypatch):
+	hashes = []
+
+	digest = AlbumArtCache.digest
+
+	def hash_album_art(album_art):
+		hashes.append(album_art)
+		return digest(album_art)
+
+	monkeypatch.setattr(AlbumArtCache, 'digest', staticmethod(hash_album_art))
+
+	cache = AlbumArtCache()
+	song = PreparedSong(TEST_MP3_ID3V2, album_art_cache=cache)
+
+	assert song.album_art_b64.startswith('iVBORw0KGgo')
+	assert song.album_art_hash in cache
+	assert cache.get(song.album_art_hash) is song.album_art
+	assert len(hashes) == 1
+
+
+FFMPEG_CODECS = '\n'.join(
+	[
+		'Codecs:',
+		' D..... = Decoding supported',
+		' .E.... = Encoding supported',
+		' -------',
+		' DEA.L. flac                 FLAC (Free Lossless Audio Codec)',
+		' DEA.L. mp3                  MP3 (MPEG audio layer 3) (decoders: mp3float mp3 ) (encoders: libmp3lame )',
+		'',
+	]
+)
+
+FFMPEG_FORMATS = '\n'.join(
+	[
+		'File formats:',
+		' D. = Demuxing supported',
+		' .E = Muxing supported',
+		' --',
+		' DE flac            raw FLAC',
+		' D  mov,mp4,m4a,3gp,3g2,mj2 QuickTime / MOV',
+		'',
+	]
+)
+
+
+def test_transcoder_registry(monkeypatch):
+	commands = []
+
+	def run(command, **kwargs):
+		commands.append(command)
+		stdout = FFMPEG_FORMATS if '-formats' in command else FFMPEG_CODECS
+
+		if command[0] == '/bin/avconv':
+			stdout = stdout.replace('libmp3lame', 'libshine')
+
+		return subprocess.CompletedProcess(command, 0, stdout, 'ffmpeg version 4.2.2 Copyright\n')
+
+	monkeypatch.setattr(utils.shutil, 'which', lambda name, path=None: f'/bin/{name}')
+	monkeypatch.setattr(utils.subprocess, 'run', run)
+
+	transcoders = TranscoderRegistry()
+	transcoder = transcoders.get()
+
+	assert transcoder.path == '/bin/ffmpeg'
+	assert transcoder.version == 'ffmpeg version 4.2.2 Copyright'
+	assert transcoder.decoders == {'flac', 'mp3float', 'mp3'}
+	assert transcoder.encoders == {'flac', 'libmp3lame'}
+	assert transcoder.input_formats == {'flac', 'mov', 'mp4', 'm4a', '3gp', '3g2', 'mj2'}
+	assert transcoder.mp3_encoding_support
+
+	# Probed once.
+	assert transcoders.get() is transcoder
+	assert len(commands) == 2
+
+	transcoders.refresh()
+	assert transcoders.get() == transcoder
+	assert len(commands) == 4
+
+	transcoders.names = ['avconv']
+	transcoders.refresh()
+	with pytest.raises(ValueError):
+		transcoders.get()
+
+
+def _python_command(code):
+	return [sys.executable, '-c', code]
+
+
+def test_transcode_stream():
+	command = _python_command(
+		'import sys\n'
+		'data = sys.stdin.buffer.read()\n'
+		'for _ in range(100):\n'
+		'    sys.stdout.buffer.write(data)\n'
+	)
+
+	with TranscodeStream(command, b'\x00' * 1000, chunk_size=4096) as stream:
+		chunks = list(stream)
+
+	assert all(len(chunk) <= 4096 for chunk in chunks)
+	assert b''.join(chunks) == b'\x00' * 100000
+
+
+def test_transcode_stream_close():
+	command = _python_command(
+		'import sys\n'
+		'while True:\n'
+		'    sys.stdout.buffer.write(b"\\x00" * 4096)\n'
+	)
+
+	stream = TranscodeStream(command)
+	assert stream.read(10) == b'\x00' * 10
+
+	stream.close()
+	assert stream._process.returncode is not None
+
+	with pytest.raises(ValueError):
+		stream.read()
+
+
+def test_transcode_stream_error():
+	command = _python_command(
+		'import sys\n'
+		'sys.stdout.buffer.write(b"output")\n'
+		'sys.stderr.write("error")\n'
+		'sys.exit(1)\n'
+	)
+
+	with TranscodeStream(command) as stream:
+		with pytest.raises(subprocess.CalledProcessError) as exc_info:
+			stream.read()
+
+	assert exc_info.value.stderr == b'error'
+
+
+def test_transcode_to_mp3_seek(monkeypatch):
+	commands = []
+	outputs = []
+
+	def transcode(command, input_=None, **kwargs):
+		commands.append(command)
+		return outputs.pop(0)
+
+	monkeypatch.setattr(utils, 'get_transcoder', lambda: 'ffmpeg')
+	monkeypatch.setattr(utils, '_transcode', transcode)
+	monkeypatch.setattr(utils, 'transcode_backends', [utils.FFmpegBackend()])
+
+	outputs[:] = [b'mp3']
+	assert transcode_to_mp3(TEST_FLAC, slice_start=15, slice_duration=30, quality='128k', seek='input') == b'mp3'
+	assert commands.pop() == [
+		'ffmpeg', '-ss', '15', '-i', str(TEST_FLAC), '-t', '30', '-b:a', '128k',
+		'-f', 's16le', '-c', 'libmp3lame', '-',
+	]
+
+	# Falls back to output seeking if input seeking produces no audio.
+	outputs[:] = [b'', b'mp3']
+	assert transcode_to_mp3(TEST_FLAC, slice_start=15, slice_duration=30, seek='input') == b'mp3'
+	assert commands[-1][1:5] == ['-i', str(TEST_FLAC), '-t', '30']
+	assert commands[-1][5:7] == ['-ss', '15']
+
+	outputs[:] = [b'']
+	assert transcode_to_mp3(TEST_FLAC, slice_start=15, seek='input', seek_fallback=False) == b''
+
+	with pytest.raises(ValueError):
+		transcode_to_mp3(TEST_FLAC, seek='middle')
+
+
+def test_slice_mp3():
+	audio = slice_mp3(TEST_MP3_ID3V2)
+	assert audio.startswith(b'\xFF\xFB')
+	assert b'ID3' not in audio and b'Xing' not in audio
+
+	# Same audio frames regardless of tags.
+	assert slice_mp3(TEST_MP3_ID3V1) == audio
+	assert slice_mp3(TEST_MP3_ID3V2.read_bytes()) == audio
+
+	sliced = slice_mp3(TEST_MP3_ID3V2, slice_start=1, slice_duration=2)
+	assert sliced.startswith(b'\xFF\xFB')
+	assert sliced in audio
+	assert 0 < len(sliced) < len(audio)
+
+	assert slice_mp3(PreparedSong(TEST_MP3_ID3V2), slice_start=1, slice_duration=2) == sliced
+	assert slice_mp3(TEST_MP3_ID3V2, slice_start=60) == b''
+
+	with pytest.raises(ValueError):
+		slice_mp3(TEST_FLAC)
+
+
+def test_transcode_to_mp3_native_mp3(monkeypatch):
+	inputs = []
+
+	def transcode(command, input_=None, **kwargs):
+		inputs.append((command, input_))
+		return b'mp3'
+
+	monkeypatch.setattr(utils, 'get_transcoder', lambda: 'ffmpeg')
+	monkeypatch.setattr(utils, '_transcode', transcode)
+	monkeypatch.setattr(utils, 'transcode_backends', [utils.FFmpegBackend()])
+
+	# At or below the requested bitrate, frames are cut without transcoding.
+	sample = transcode_to_mp3(TEST_MP3_ID3V2, slice_start=1, slice_duration=2, quality='128k', native_mp3=True)
+	assert sample == slice_mp3(TEST_MP3_ID3V2, slice_start=1, slice_duration=2)
+	assert not inputs
+
+	# Otherwise only the frames around the slice are transcoded.
+	assert transcode_to_mp3(TEST_MP3_ID3V2, slice_start=3, slice_duration=1, quality=5, native_mp3=True) == b'mp3'
+	command, input_ = inputs.pop()
+	assert command[1:3] == ['-i', '-']
+	assert input_ in slice_mp3(TEST_MP3_ID3V2)
+	assert len(input_) < len(slice_mp3(TEST_MP3_ID3V2, slice_start=2))
+	assert 0 < float(command[command.index('-ss') + 1]) < 1
+
+	# Other formats are transcoded as usual.
+	assert transcode_to_mp3(TEST_FLAC, slice_start=1, slice_duration=2, quality='128k', native_mp3=True) == b'mp3'
+	assert inputs.pop()[0][1:3] == ['-i', str(TEST_FLAC)]
+
+
+def test_transcode_spool_size():
+	command = [sys.executable, '-c', 'import sys; sys.stdout.buffer.write(b"mp3" * 100)']
+
+	assert utils._transcode(command) == b'mp3' * 100
+	assert utils._transcode(command, spool_size=300) == b'mp3' * 100
+
+	output = utils._transcode(command, spool_size=299)
+	assert isinstance(output, mmap.mmap)
+	assert output[:] == b'mp3' * 100
+	output.close()
+
+	with pytest.raises(subprocess.CalledProcessError) as exc_info:
+		utils._transcode([sys.executable, '-c', 'import sys; sys.exit(1)'], spool_size=0)
+
+	assert exc_info.value.message
+
+
+class _Backend(TranscodeBackend):
+	name = 'test'
+
+	def __init__(self, output):
+		self.output = output
+		self.calls = []
+
+	def transcode(self, song, **kwargs):
+		self.calls.append((song, kwargs))
+		return self.output
+
+
+def test_transcode_backends(monkeypatch):
+	unsupported = _Backend(None)
+	supported = _Backend(b'mp3')
+	monkeypatch.setattr(utils, 'transcode_backends', [unsupported, supported])
+
+	assert transcode_to_mp3(TEST_WAV, slice_start=1, slice_duration=2, quality='128k') == b'mp3'
+	assert unsupported.calls == supported.calls
+	assert supported.calls[0][1]['slice_start'] == 1
+	assert supported.calls[0][1]['quality'] == '128k'
+
+	with pytest.raises(ValueError):
+		transcode_to_mp3(TEST_WAV, backend=unsupported)
+
+
+def test_lame_backend():
+	pytest.importorskip('lameenc')
+
+	backend = LAMEBackend()
+
+	output = backend.transcode(TEST_WAV, slice_start=0.5, slice_duration=1, quality='128k')
+	frames = list(utils._iter_mp3_frames(output, 0, len(output)))
+	assert sum(frame_size for _, (frame_size, _, _) in frames) == len(output)
+	assert {sample_rate for _, (_, _, sample_rate) in frames} == {44100}
+	# About a second of audio with the encoder delay and padding.
+	assert 38 <= len(frames) <= 42
+
+	output = backend.transcode(TEST_WAV, quality=5, spool_size=0)
+	assert isinstance(output, mmap.mmap)
+	assert output[:2] == b'\xFF\xFB'
+	output.close()
+
+	assert backend.transcode(TEST_WAV, slice_start=60) == b''
+	assert backend.transcode(TEST_WAV, quality='high') is None
+
+
+def test_transcode_timeout():
+	timings = []
+
+	start = time.perf_counter()
+	with pytest.raises(subprocess.TimeoutExpired) as exc_info:
+		utils._transcode([sys.executable, '-c', 'import time; time.sleep(30)'], timeout=0.5, timings=timings)
+
+	assert time.perf_counter() - start < 10
+	assert 'timed out' in exc_info.value.message
+
+	timing, = timings
+	assert timing.timed_out
+	# Killed and reaped.
+	assert timing.returncode is not None and timing.returncode != 0
+	assert timing.output_size is None
+
+	utils._transcode([sys.executable, '-c', 'import sys; sys.stdout.buffer.write(b"mp3")'], timings=timings)
+	assert not timings[-1].timed_out
+	assert timings[-1].returncode == 0
+	assert timings[-1].output_size == 3
+	assert timings[-1].wall_time > 0
+
+
+@pytest.mark.skipif(
+	not hasattr(utils.resource, 'prlimit'),
+	reason="Resource limits require resource.prlimit.",
+)
+def test_transcode_resource_limits():
+	with pytest.raises(subprocess.CalledProcessError):
+		utils._transcode([sys.executable, '-c', 'while True: pass'], cpu_time_limit=1, timeout=30)
+
+	# Limits are set after the process starts.
+	with pytest.raises(subprocess.CalledProcessError) as exc_info:
+		utils._transcode(
+			[sys.executable, '-c', 'import time; time.sleep(0.5); b"x" * (1024 ** 3)'],
+			memory_limit=512 * 1024 * 1024,
+			timeout=30,
+		)
+
+	assert b'MemoryError' in exc_info.value.stderr
+
+
+def test_ffmpeg_backend_timeout(monkeypatch):
+	transcodes = []
+
+	def transcode(command, input_=None, **kwargs):
+		transcodes.append(kwargs)
+		return b'mp3'
+
+	monkeypatch.setattr(utils, 'get_transcoder', lambda: 'ffmpeg')
+	monkeypatch.setattr(utils, '_transcode', transcode)
+
+	backend = utils.FFmpegBackend(timeout=60, cpu_time_limit=30, memory_limit=1024)
+	transcode_to_mp3(TEST_FLAC, backend=backend)
+	transcode_to_mp3(TEST_FLAC, backend=backend, timeout=5)
+
+	assert [kwargs['timeout'] for kwargs in transcodes] == [60, 5]
+	assert transcodes[0]['cpu_time_limit'] == 30
+	assert transcodes[0]['memory_limit'] == 1024